@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import m2m_changed
 
 
 class AlgoConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'algo'
+
+    def ready(self):
+        from algo.cache import invalidate_on_scope_change
+        from ticker.models import Scope
+        m2m_changed.connect(invalidate_on_scope_change, sender=Scope.tickers.through,
+                            dispatch_uid='algo_cache_scope_invalidation')
@@ -0,0 +1,83 @@
+import hashlib
+import json
+import logging
+
+from typing import Callable, Dict
+
+from django.core.cache import cache
+
+from algo.models import AlgoMetric
+
+logger = logging.getLogger(__name__)
+
+CACHE_TIMEOUT = 24 * 60 * 60  # seconds
+GENERATION_KEY = 'algo:source_generation'
+
+
+def get_generation() -> int:
+    return cache.get_or_set(GENERATION_KEY, 0, timeout=None)
+
+
+def invalidate():
+    """
+    Invalidates every cached algo entry. Called by ingestion when new metric source rows are written.
+    """
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:  # Generation key is missing or evicted
+        cache.set(GENERATION_KEY, 1, timeout=None)
+
+
+def invalidate_on_scope_change(sender, action: str, **kwargs):
+    """
+    Scope tickers m2m_changed receiver, scope membership defines normalization reference data.
+    """
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate()
+
+
+def digest(value) -> str:
+    return hashlib.sha1(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class MetricCache:
+    """
+    Caches normalization input data and results of algo metric.
+    Cache key covers metric configuration, reference scope and invalidation generation,
+    which is advanced by source data ingestion and scope membership changes.
+    Metric weight is not a part of the key, so weights tuning reuses cached data.
+    """
+    def __init__(self, metric: AlgoMetric):
+        self.metric = metric
+        self._key = None
+
+    @property
+    def key(self) -> str:
+        if self._key is None:
+            metric = self.metric
+            configuration = [metric.target_model, metric.target_field, metric.min_threshold, metric.max_threshold,
+                             metric.algo.reference_scope_id]
+            self._key = f'algo:metric:{metric.id}:{digest(configuration)}:{get_generation()}'
+        return self._key
+
+    def get_or_calculate(self, key: str, calculate: Callable[[], Dict]) -> Dict:
+        value = cache.get(key)
+        if value is None:
+            value = calculate()
+            cache.set(key, value, timeout=CACHE_TIMEOUT)
+        else:
+            logger.debug(f'Cache hit: {key}')
+        return value
+
+    def normalization_data(self) -> Dict:
+        return self.get_or_calculate(f'{self.key}:data', self.metric.get_normalization_data)
+
+    def normalization(self, function: Callable) -> Callable:
+        """
+        Wraps local normalization function with result cache of corresponding normalization arguments.
+        Input data is expected to be normalization_data of the metric, so it is identified by the cache key.
+        """
+        def cached(**arguments):
+            key = f'{self.key}:{arguments.get("norm_method")}:{digest(arguments.get("parameters"))}'
+            return self.get_or_calculate(key, lambda: function(**arguments))
+        return cached
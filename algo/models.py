@@ -1,8 +1,10 @@
-import json
+from datetime import date as date_type
+from typing import Dict, Iterable
 
 from django.db import models
 
-from ticker.models import Ticker, Scope, FinvizFundamental, Price, Dividend
+from lib.json_cache import CachedJSON, CachedJSONMixin
+from ticker.models import BULK_INSERT_BATCH_SIZE, Ticker, TickerSummary, Scope, FinvizFundamental, Price, Dividend
 
 
 METRIC_MODELS_REFERENCE = {
@@ -10,6 +12,12 @@ METRIC_MODELS_REFERENCE = {
     'FinvizFundamental': FinvizFundamental,
     'Price': Price
 }
+# Ticker summary fields referencing the latest instance of metric model
+SUMMARY_LATEST_ID_FIELDS = {
+    'Dividend': 'latest_dividend_id',
+    'FinvizFundamental': 'latest_fundamental_id',
+    'Price': 'latest_price_id',
+}
 
 
 class Algo(models.Model):
@@ -26,11 +34,53 @@ class Algo(models.Model):
             f'Ticker {ticker} is missing in {self.reference_scope} scope'
         return self.algoslice_set.filter(ticker=ticker)
 
+    def get_or_create_slices(self, ticker_ids: Iterable[int], date: date_type,
+                             carry_forward: bool = False) -> Dict[int, 'AlgoSlice']:
+        """
+        Returns algo slices of provided date mapped by ticker id. Missing slices are created in a single batch.
+        If carry_forward is set, created slices inherit metric slices of the latest previous ticker slice.
+        """
+        ticker_ids = set(ticker_ids)
+
+        def existing_slices() -> Dict[int, AlgoSlice]:
+            # Latest slice is used if there are several ones for the same date
+            query_set = self.algoslice_set.filter(ticker_id__in=ticker_ids, date=date).order_by('id')
+            return {algo_slice.ticker_id: algo_slice for algo_slice in query_set}
+
+        slices = existing_slices()
+        missing = ticker_ids - slices.keys()
+        if missing:
+            AlgoSlice.objects.bulk_create([AlgoSlice(algo=self, ticker_id=ticker_id, date=date) for ticker_id in missing],
+                                          batch_size=BULK_INSERT_BATCH_SIZE)
+            slices = existing_slices()  # Not every backend returns primary keys of bulk created rows
+            if carry_forward:
+                self.carry_forward_metric_slices({ticker_id: slices[ticker_id] for ticker_id in missing})
+        return slices
+
+    def carry_forward_metric_slices(self, slices: Dict[int, 'AlgoSlice']):
+        previous = AlgoMetricSlice.objects.filter(slice__algo=self, slice__ticker_id__in=slices) \
+            .exclude(slice__in=slices.values()).order_by('slice__date', 'slice_id', 'id') \
+            .values_list('slice__ticker_id', 'slice_id', 'metric_id', 'result', 'source_id')
+        latest_slices, metric_slices = {}, {}
+        for ticker_id, slice_id, metric_id, result, source_id in previous:
+            if latest_slices.get(ticker_id) != slice_id:  # Metrics of the latest previous slice only
+                latest_slices[ticker_id] = slice_id
+                metric_slices[ticker_id] = {}
+            metric_slices[ticker_id][metric_id] = (result, source_id)
+        AlgoMetricSlice.objects.bulk_create(
+            [
+                AlgoMetricSlice(slice=slices[ticker_id], metric_id=metric_id, result=result, source_id=source_id)
+                for ticker_id, metrics in metric_slices.items()
+                for metric_id, (result, source_id) in metrics.items()
+            ],
+            batch_size=BULK_INSERT_BATCH_SIZE
+        )
+
     def __str__(self):
         return f'({self.id}) "{self.name}"'  # : {self.scope}'
 
 
-class AlgoMetric(models.Model):
+class AlgoMetric(CachedJSONMixin, models.Model):
     id = models.AutoField(primary_key=True, help_text='Internal ID')
     name = models.TextField()
     algo = models.ForeignKey(Algo, on_delete=models.CASCADE)
@@ -42,39 +92,44 @@ class AlgoMetric(models.Model):
     max_threshold = models.FloatField(null=True, help_text='maximum metric value that can be used in calculations')
     method_parameters = models.TextField(default='{}', help_text='Normalization method parameters')
 
-    @property
-    def method_parameters_dict(self):
-        return json.loads(self.method_parameters)
-
-    @method_parameters_dict.setter
-    def method_parameters_dict(self, _dict: dict):
-        self.method_parameters = json.dumps(_dict)
+    method_parameters_dict = CachedJSON('method_parameters')
 
     @property
     def target_model_class(self):
         return METRIC_MODELS_REFERENCE.get(self.target_model)
 
-    def get_normalization_data(self):
-        data = {}
-        tickers = self.algo.reference_scope.tickers.all()
-        for tkr in tickers:
-            # TODO: Refactor query filter
-            _obj = self.target_model_class.objects.filter(ticker=tkr).last()
-            if not _obj:  # Ignore ticker if it has no reference model instances
-                continue
-            value = getattr(_obj, self.target_field, None)
-            if value is None:  # Ignore empty field of corresponding reference model
-                continue
-            if self.max_threshold and self.max_threshold < value:  # Ignore value if it is over max limit
-                continue
-            if self.min_threshold and self.min_threshold > value:  # Ignore value if it is under min limit
-                continue
-            data[_obj.id] = value
-        return data
+    def get_normalization_data(self, changed_only: bool = False):
+        """
+        Returns latest reference model values of scope tickers mapped by reference model instance id.
+        If changed_only is set, tickers whose latest instance is already applied to metric slices are skipped.
+        """
+        # Latest reference model instance per scope ticker is resolved in a single query
+        model = self.target_model_class
+        latest_ids = model.objects.filter(ticker__scope=self.algo.reference_scope) \
+            .values('ticker').annotate(latest_id=models.Max('id')).values('latest_id')
+        # Ignore empty field of corresponding reference model
+        query_set = model.objects.filter(id__in=latest_ids, **{f'{self.target_field}__isnull': False})
+        if self.max_threshold:  # Ignore value if it is over max limit
+            query_set = query_set.filter(**{f'{self.target_field}__lte': self.max_threshold})
+        if self.min_threshold:  # Ignore value if it is under min limit
+            query_set = query_set.filter(**{f'{self.target_field}__gte': self.min_threshold})
+        if changed_only:
+            processed_id = AlgoMetricSlice.objects.filter(metric=self, slice__ticker=models.OuterRef('ticker')) \
+                .values('slice__ticker').annotate(processed_id=models.Max('source_id')).values('processed_id')
+            query_set = query_set.annotate(processed_id=models.Subquery(processed_id)) \
+                .filter(models.Q(processed_id__isnull=True) | models.Q(id__gt=models.F('processed_id')))
+        return dict(query_set.order_by('id').values_list('id', self.target_field))
+
+    def get_latest_instance(self, ticker: Ticker):
+        summaries = TickerSummary.objects.filter(ticker=ticker)
+        latest_id = summaries.values(SUMMARY_LATEST_ID_FIELDS[self.target_model])
+        # The latest instance is referenced by ticker summary, the last one is used for tickers without summary
+        query_set = self.target_model_class.objects.filter(ticker=ticker)\
+            .filter(models.Q(id=models.Subquery(latest_id)) | ~models.Exists(summaries))
+        return query_set.order_by('id').last()
 
     def get_ticker_data(self, ticker: Ticker):
-        # TODO: Refactor query filter
-        _obj = self.target_model_class.objects.filter(ticker=ticker).last()
+        _obj = self.get_latest_instance(ticker)
         if not _obj:  # Ignore ticker if it has no reference model instances
             return
         value = getattr(_obj, self.target_field, None)
@@ -110,6 +165,7 @@ class AlgoMetricSlice(models.Model):
     slice = models.ForeignKey(AlgoSlice, on_delete=models.CASCADE)
     metric = models.ForeignKey(AlgoMetric, on_delete=models.CASCADE)
     result = models.FloatField(null=True, help_text='metric rating')
+    source_id = models.IntegerField(null=True, help_text='Metric target model instance ID')
 
     def __str__(self):
         return f'({self.id})"{self.metric.algo.name}/{self.metric.name}":{self.result}'
@@ -0,0 +1,80 @@
+import logging
+
+from typing import Callable, Dict, Tuple, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+RESULT_PRECISION = 4
+
+
+def minmax_parameters(values: np.ndarray) -> Dict[str, float]:
+    return {'min': float(values.min()), 'max': float(values.max())}
+
+
+def minmax(values: np.ndarray, parameters: Dict[str, float]) -> np.ndarray:
+    value_range = parameters['max'] - parameters['min']
+    if not value_range:
+        return np.zeros_like(values)
+    return (values - parameters['min']) / value_range
+
+
+def minmax_inverted(values: np.ndarray, parameters: Dict[str, float]) -> np.ndarray:
+    return 1 - minmax(values, parameters)
+
+
+def z_score_parameters(values: np.ndarray) -> Dict[str, float]:
+    return {'mean': float(values.mean()), 'std': float(values.std())}
+
+
+def z_score(values: np.ndarray, parameters: Dict[str, float]) -> np.ndarray:
+    if not parameters['std']:
+        return np.zeros_like(values)
+    return (values - parameters['mean']) / parameters['std']
+
+
+def robust_parameters(values: np.ndarray) -> Dict[str, float]:
+    first_quartile, median, third_quartile = np.percentile(values, [25, 50, 75])
+    return {'median': float(median), 'iqr': float(third_quartile - first_quartile)}
+
+
+def robust(values: np.ndarray, parameters: Dict[str, float]) -> np.ndarray:
+    if not parameters['iqr']:
+        return np.zeros_like(values)
+    return (values - parameters['median']) / parameters['iqr']
+
+
+# Normalization method name: (parameters calculation, normalization)
+METHODS: Dict[str, Tuple[Callable, Callable]] = {
+    'minmax': (minmax_parameters, minmax),
+    'minmax_inverted': (minmax_parameters, minmax_inverted),
+    'z_score': (z_score_parameters, z_score),
+    'robust': (robust_parameters, robust),
+}
+METHOD_PARAMETERS = {
+    'minmax': ('min', 'max'),
+    'minmax_inverted': ('min', 'max'),
+    'z_score': ('mean', 'std'),
+    'robust': ('median', 'iqr'),
+}
+
+
+def normalization(input_data: Dict[str, Union[int, float]], norm_method: str, parameters: Dict = None, **kwargs):
+    """
+    In-process counterpart of findus_edge.algo.normalization.normalization DCN function.
+    Method parameters are calculated from input data unless all of them are provided.
+    Extra task arguments (e.g. metric_id) are ignored.
+    """
+    if norm_method not in METHODS:
+        raise ValueError(f'Unknown normalization method: {norm_method}')
+    calculate_parameters, normalize = METHODS[norm_method]
+    keys = list(input_data)
+    values = np.fromiter((input_data[key] for key in keys), dtype=float, count=len(keys))
+    parameters = parameters or {}
+    if not all(name in parameters for name in METHOD_PARAMETERS[norm_method]):
+        if not keys:
+            return {'parameters': parameters, 'result': {}}
+        parameters = calculate_parameters(values)
+    normalized = np.round(normalize(values, parameters), RESULT_PRECISION)
+    return {'parameters': parameters, 'result': dict(zip(keys, normalized.tolist()))}
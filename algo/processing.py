@@ -2,10 +2,13 @@ import logging
 import sys
 import inspect
 
+from django.db import transaction
 from django.utils.timezone import now
 
+from algo.cache import MetricCache
 from algo.models import Algo, AlgoMetric, AlgoSlice, AlgoMetricSlice
 from task.models import Task
+from ticker.models import BULK_INSERT_BATCH_SIZE
 
 
 logger = logging.getLogger(__name__)
@@ -17,14 +20,14 @@ def collect_normalization_data(task: Task):
     metric: AlgoMetric = AlgoMetric.objects.get(id=metric_id)
     args.update(
         {
-            "input_data": metric.get_normalization_data(),
+            "input_data": MetricCache(metric).normalization_data(),
             "norm_method": metric.normalization_method,
             "parameters": metric.method_parameters_dict
         }
     )
     # logger.debug(args)
     task.arguments_dict = args
-    task.save()
+    task.save_json()
     return True
 
 
@@ -37,28 +40,50 @@ def set_metric_params(task: Task):
     metric_params = metric.method_parameters_dict
     metric_params.update(calculated_parameters)
     metric.method_parameters_dict = metric_params
-    metric.save()
+    metric.save_json()
     return True
 
 
 def append_slices(task: Task):
+    """
+    Stores normalized metric values to the day's algo slices. Existing metric slices are updated
+    and ratings of affected slices are reset for recalculation.
+    In incremental mode, created slices inherit other metrics of the previous ticker slice.
+    """
     args = task.arguments_dict
     metric_id = args['metric_id']
     metric: AlgoMetric = AlgoMetric.objects.get(id=metric_id)
     result = task.result_dict
-    normalized = result['result']
-    for model_obj_id in normalized:
-        model_obj = metric.target_model_class.objects.get(id=model_obj_id)
-        algo_slices: AlgoSlice = AlgoSlice.objects.filter(algo=metric.algo, ticker=model_obj.ticker, date=now().date())
-        if algo_slices:
-            algo_slice: AlgoSlice = algo_slices.last()
-        else:
-            algo_slice: AlgoSlice = AlgoSlice.objects.create(algo=metric.algo, ticker=model_obj.ticker, date=now().date())
-            algo_slice.save()
-        # logger.debug(algo_slice)
-        metric_slice: AlgoMetricSlice = AlgoMetricSlice.objects.create(slice=algo_slice, metric=metric, result=normalized[model_obj_id])
-        metric_slice.save()
-        # logger.debug(metric_slice)
+    normalized = {int(model_obj_id): value for model_obj_id, value in result['result'].items()}
+    ticker_ids = dict(
+        metric.target_model_class.objects.filter(id__in=normalized).values_list('id', 'ticker_id')
+    )
+    missing = normalized.keys() - ticker_ids.keys()
+    if missing:
+        logger.warning(f'{metric} source objects are missing: {sorted(missing)}')
+    with transaction.atomic():
+        algo_slices = metric.algo.get_or_create_slices(ticker_ids.values(), now().date(),
+                                                       carry_forward=args.get('incremental', False))
+        metric_slices = {
+            metric_slice.slice_id: metric_slice
+            for metric_slice in AlgoMetricSlice.objects.filter(metric=metric, slice__in=algo_slices.values())
+        }
+        created, updated = [], []
+        for model_obj_id, value in normalized.items():
+            if model_obj_id not in ticker_ids:
+                continue
+            algo_slice = algo_slices[ticker_ids[model_obj_id]]
+            metric_slice = metric_slices.get(algo_slice.id)
+            if metric_slice:
+                metric_slice.result = value
+                metric_slice.source_id = model_obj_id
+                updated.append(metric_slice)
+            else:
+                created.append(AlgoMetricSlice(slice=algo_slice, metric=metric, result=value, source_id=model_obj_id))
+        AlgoMetricSlice.objects.bulk_create(created, batch_size=BULK_INSERT_BATCH_SIZE)
+        AlgoMetricSlice.objects.bulk_update(updated, ['result', 'source_id'], batch_size=BULK_INSERT_BATCH_SIZE)
+        AlgoSlice.objects.filter(id__in=[algo_slice.id for algo_slice in algo_slices.values()]).update(result=None)
+    logger.debug(f'{len(created)} metric slice(s) appended and {len(updated)} updated for {metric}')
     return True
 
 
@@ -0,0 +1,52 @@
+import logging
+
+from typing import Dict
+
+import numpy as np
+
+from django.db import transaction
+
+from algo.models import Algo, AlgoMetricSlice, AlgoSlice
+
+logger = logging.getLogger(__name__)
+
+RATE_PRECISION = 4
+RATE_UPDATE_BATCH_SIZE = 1000
+
+
+def weight(metrics: Dict[str, Dict], **kwargs) -> Dict[str, float]:
+    """
+    In-process counterpart of findus_edge.algo.metrics.weight DCN function.
+    Rate is a sum of metric values multiplied by their weights, empty metric values are not rated.
+    """
+    rate = sum(metric['value'] * metric['weight'] for metric in metrics.values() if metric['value'] is not None)
+    return {'rate': round(rate, RATE_PRECISION)}
+
+
+def rate_slices(algo: Algo) -> int:
+    """
+    Rates all unrated algo slices at once: metric results are loaded as slice x metric matrix
+    and multiplied by metric weights vector. Returns rated slice count.
+    """
+    metrics = list(algo.metrics.order_by('id'))
+    metric_index = {metric.id: idx for idx, metric in enumerate(metrics)}
+    weights = np.array([metric.weight for metric in metrics], dtype=float)
+    algo_slices = list(algo.algoslice_set.filter(result__isnull=True).order_by('id'))
+    if not algo_slices:
+        return 0
+    slice_index = {algo_slice.id: idx for idx, algo_slice in enumerate(algo_slices)}
+    metric_slices = AlgoMetricSlice.objects.filter(slice_id__in=slice_index).order_by('id')
+    rows, columns, values = [], [], []
+    for slice_id, metric_id, result in metric_slices.values_list('slice_id', 'metric_id', 'result'):
+        rows.append(slice_index[slice_id])
+        columns.append(metric_index[metric_id])
+        values.append(0.0 if result is None else result)  # empty metric value is not rated
+    matrix = np.zeros((len(algo_slices), len(metrics)), dtype=float)
+    matrix[rows, columns] = values  # the latest metric slice wins like in per-slice rating
+    rates = np.round(matrix @ weights, RATE_PRECISION)
+    for algo_slice, rate in zip(algo_slices, rates.tolist()):
+        algo_slice.result = rate
+    with transaction.atomic():
+        AlgoSlice.objects.bulk_update(algo_slices, ['result'], batch_size=RATE_UPDATE_BATCH_SIZE)
+    logger.info(f'{len(algo_slices)} slice(s) of {algo} are rated')
+    return len(algo_slices)
@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_save
 
 
 class FlowConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'flow'
+
+    def ready(self):
+        from lib.notification import FLOW_CHANNEL, notify_on_save
+        from flow.models import Flow
+        post_save.connect(notify_on_save(FLOW_CHANNEL), sender=Flow, weak=False, dispatch_uid='flow_notification')
@@ -7,32 +7,44 @@ from datetime import timedelta
 from django.utils.timezone import now
 
 from flow.models import Flow, FlowState
+from task.models import TaskState
 from flow.workflow import get_workflow_map
 from task.lib.constants import FLOW_PROCESSING_QUOTAS
-from lib.db import (DatabaseMixin, get_created_flows, get_done_flows, get_running_flows,
-                    get_postponed_flows, generic_query_set_generator)
+from lib.db import (DatabaseMixin, ClaimCursor, get_created_flows, get_done_flows, get_running_flows,
+                    get_postponed_flows, get_worker_id)
 from lib.common_service import CommonServiceMixin
+from lib.notification import FLOW_CHANNEL, TASK_CHANNEL, NotificationListener
 from schedule.lib.interface import Scheduler
 
 logger = logging.getLogger('flow_processor')
 
+FLOW_PROCESSING_FIELDS = ['stage', 'processing_state', 'postponed', 'claimed_by']
+
 
 class FlowProcessor(CommonServiceMixin, DatabaseMixin):
     def __init__(self):
         CommonServiceMixin.__init__(self)
+        self.worker = get_worker_id()
         self.queues = {
-                FlowState.CREATED: generic_query_set_generator(get_created_flows),
-                FlowState.RUNNING: generic_query_set_generator(get_running_flows),
-                FlowState.POSTPONED: generic_query_set_generator(get_postponed_flows),
-                FlowState.DONE: generic_query_set_generator(get_done_flows),
-            }
+            state: ClaimCursor(query_getter, self.worker, FLOW_PROCESSING_QUOTAS[state])
+            for state, query_getter in (
+                (FlowState.CREATED, get_created_flows),
+                (FlowState.RUNNING, get_running_flows),
+                (FlowState.POSTPONED, get_postponed_flows),
+                (FlowState.DONE, get_done_flows),
+            )
+        }
         self.stages = (
             (self.start_flow, FlowState.CREATED),
             (self.process_flow, FlowState.RUNNING),
             (self.cancel_postpone, FlowState.POSTPONED),
             (self.cleanup_done, FlowState.DONE),
         )
-        self.quotas = FLOW_PROCESSING_QUOTAS
+        self.init_quotas(FLOW_PROCESSING_QUOTAS)
+        self.listener = NotificationListener({
+            FLOW_CHANNEL: (FlowState.CREATED, FlowState.DONE),
+            TASK_CHANNEL: (TaskState.PROCESSED,),
+        })
         self.workflow_map = get_workflow_map()
 
     def start_flow(self, flow: Flow):
@@ -40,7 +52,7 @@ class FlowProcessor(CommonServiceMixin, DatabaseMixin):
         start_result = self.process_flow(flow)
         if start_result:
             flow.state = FlowState.RUNNING
-            flow.save()
+            flow.save(update_fields=['processing_state'])
         return start_result
 
     def process_flow(self, flow: Flow):
@@ -66,11 +78,14 @@ class FlowProcessor(CommonServiceMixin, DatabaseMixin):
         #     scheduler: Scheduler = Scheduler(event_name='flow_failure', artifacts=json.dumps({"flow": flow.id}))
         #     scheduler.push()
         #     flow.postponed = now() + timedelta(days=92)
-        flow.save()
+        flow.claimed_by = None
+        # Waiting mark is maintained by stages and task side directly in database
+        flow.save(update_fields=FLOW_PROCESSING_FIELDS)
         return processing_result
 
     def cancel_postpone(self, flow: Flow):
         flow.postponed = None
+        flow.claimed_by = None
         flow.save()
         return True
 
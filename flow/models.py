@@ -1,11 +1,11 @@
-import json
-
 from datetime import datetime, timedelta
 from typing import List
 
 from django.db import models
+from django.db.models import Q
 from django.utils.timezone import now
 
+from lib.json_cache import CachedJSON, CachedJSONMixin
 from task.models import Task
 
 
@@ -18,7 +18,7 @@ class FlowState:
     choices = ((state, state) for state in states)
 
 
-class Flow(models.Model):
+class Flow(CachedJSONMixin, models.Model):
 
     class Priorities(models.IntegerChoices):
         BLOCKING = 0
@@ -30,10 +30,24 @@ class Flow(models.Model):
     name = models.CharField(max_length=100)
     stage = models.IntegerField(default=0)
     event = models.ForeignKey('schedule.Event', null=True, on_delete=models.CASCADE)
+    parent_flow = models.ForeignKey('self', null=True, on_delete=models.CASCADE, related_name='child_flows',
+                                    help_text='Flow that spawned this one')
     processing_state = models.CharField(max_length=10, choices=FlowState.choices, default=FlowState.CREATED)
     arguments = models.TextField(default='{}')
     postponed = models.DateTimeField(null=True)
     priority = models.IntegerField(choices=Priorities.choices, default=Priorities.MEDIUM)
+    claimed_by = models.CharField(max_length=100, null=True, help_text='Worker that claimed the flow')
+    claimed = models.DateTimeField(null=True)
+    waiting = models.DateTimeField(null=True, help_text='Flow waits for tasks processing since')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['processing_state', 'id'], condition=Q(postponed__isnull=True),
+                         name='flow_active_state_id_idx'),
+            models.Index(fields=['postponed'], condition=Q(postponed__isnull=False), name='flow_postponed_idx'),
+            # parent flow completion check: children in other than done state
+            models.Index(fields=['parent_flow', 'processing_state'], name='flow_parent_state_idx'),
+        ]
 
     @property
     def state(self):
@@ -46,13 +60,7 @@ class Flow(models.Model):
     def state(self, state: str):
         self.processing_state = state
 
-    @property
-    def arguments_dict(self):
-        return json.loads(self.arguments)
-
-    @arguments_dict.setter
-    def arguments_dict(self, _dict: dict):
-        self.arguments = json.dumps(_dict)
+    arguments_dict = CachedJSON('arguments')
 
     @property
     def tasks(self) -> Task:
@@ -1,24 +1,40 @@
 import json
 import logging
 from datetime import timedelta
-from typing import Dict, List
+from typing import Callable, Dict, List, Optional
 
 from django.utils.timezone import now
 
+from algo.cache import MetricCache
 from algo.models import Algo, AlgoMetric, AlgoSlice, AlgoMetricSlice
+from algo.normalization import normalization
+from algo.rating import rate_slices, weight
 from algo.processing import collect_normalization_data, append_slices
 from flow.models import Flow
 from flow.workflow.generic import Workflow, TaskHandler, ChildWorkflowHandler
+from task.lib.constants import DCN_ENGINE, LOCAL_ENGINE
 from task.models import Task, TaskState
 from ticker.models import Ticker
 
 
-class CalculateAlgoMetricsWorkflow(Workflow, TaskHandler):
+class LocalEngineHandler(TaskHandler):
+
+    @property
+    def is_local_engine(self: Workflow) -> bool:
+        # Algo calculations are sent to DCN unless local engine is requested
+        return self.arguments.get('engine', DCN_ENGINE) == LOCAL_ENGINE
+
+    def local_function(self, function: Callable) -> Optional[Callable]:
+        return function if self.is_local_engine else None
+
+
+class CalculateAlgoMetricsWorkflow(Workflow, LocalEngineHandler):
     flow_name = 'calculate_algo_metrics'
     '''
     Flow arguments dict should have following keys:
      - algo_name
      - is_reference - whether reference metric values should be used
+     - engine (optional) - "dcn" (default) or "local" normalization engine
     '''
     def stage_0(self):
         for key in ['algo_name', 'is_reference']:
@@ -26,19 +42,20 @@ class CalculateAlgoMetricsWorkflow(Workflow, TaskHandler):
                 raise ValueError(f'{key} is not defined for algorythm metric calculation workflow')
         algo = Algo.objects.get(name=self.arguments['algo_name'])
         for metric in algo.metrics:
-            task = Task.objects.create(
+            metric_cache = MetricCache(metric)
+            local_function = self.local_function(normalization)
+            self.create_task(
                 name='calculate_metric',
-                flow=self.flow,
                 module='findus_edge.algo.normalization',
                 function='normalization',
+                arguments={
+                    "input_data": metric_cache.normalization_data(),
+                    "norm_method": metric.normalization_method,
+                    "metric_id": metric.id
+                    # "parameters": metric.method_parameters_dict
+                },
+                local_function=metric_cache.normalization(local_function) if local_function else None,
             )
-            task.arguments_dict = {
-                "input_data": metric.get_normalization_data(),
-                "norm_method": metric.normalization_method,
-                "metric_id": metric.id
-                # "parameters": metric.method_parameters_dict
-            }
-            task.save()
         return True
 
     def stage_1(self):
@@ -54,42 +71,55 @@ class CalculateAlgoMetricsWorkflow(Workflow, TaskHandler):
             metric_params = metric.method_parameters_dict
             metric_params.update(calculated_parameters)
             metric.method_parameters_dict = metric_params
-            metric.save()
+            metric.save_json()
             return True
 
         return self.map_task_results([set_metric_params, append_slices])
 
 
-class ApplyAlgoMetricsWorkflow(Workflow, TaskHandler):
+class ApplyAlgoMetricsWorkflow(Workflow, LocalEngineHandler):
     flow_name = 'apply_algo_metrics'
     '''
     Flow arguments dict should have following keys:
      - algo_name
      - is_reference - whether reference metric values should be used
+     - ticker - ticker symbol, not required in incremental mode
+     - incremental (optional) - apply stored metric parameters to every scope ticker
+       with metric source data changed since the last application
+     - engine (optional) - "dcn" (default) or "local" normalization engine
     '''
+    @property
+    def incremental(self) -> bool:
+        return self.arguments.get('incremental', False)
+
     def stage_0(self):
-        for key in ['algo_name', 'ticker']:
+        required = ['algo_name'] if self.incremental else ['algo_name', 'ticker']
+        for key in required:
             if key not in self.arguments:
                 raise ValueError(f'{key} is not defined for algorythm metric calculation workflow')
         algo = Algo.objects.get(name=self.arguments['algo_name'])
-        ticker = Ticker.objects.get(symbol=self.arguments['ticker'])
+        ticker = None if self.incremental else Ticker.objects.get(symbol=self.arguments['ticker'])
+        local_function = self.local_function(normalization)
         for metric in algo.metrics:
-            metric_argument = metric.get_ticker_data(ticker)
-            if metric_argument is None:
+            if self.incremental:
+                metric_argument = metric.get_normalization_data(changed_only=True)
+            else:
+                metric_argument = metric.get_ticker_data(ticker)
+            if not metric_argument:
                 continue
-            task = Task.objects.create(
+            self.create_task(
                 name='apply_metric',
-                flow=self.flow,
                 module='findus_edge.algo.normalization',
                 function='normalization',
+                arguments={
+                    "input_data": metric_argument,
+                    "norm_method": metric.normalization_method,
+                    "metric_id": metric.id,
+                    "parameters": metric.method_parameters_dict,
+                    "incremental": self.incremental,
+                },
+                local_function=local_function,
             )
-            task.arguments_dict = {
-                "input_data": metric_argument,
-                "norm_method": metric.normalization_method,
-                "metric_id": metric.id,
-                "parameters": metric.method_parameters_dict,
-            }
-            task.save()
         return True
 
     def stage_1(self):
@@ -98,13 +128,20 @@ class ApplyAlgoMetricsWorkflow(Workflow, TaskHandler):
     def stage_2(self):
         return self.map_task_results([append_slices])
 
+    def stage_3(self):
+        # Slices affected by incremental update are re-rated in place with local engine
+        if self.incremental and self.is_local_engine:
+            rate_slices(Algo.objects.get(name=self.arguments['algo_name']))
+        return True
+
 
-class RateAlgoSliceWorkflow(Workflow, TaskHandler):
+class RateAlgoSliceWorkflow(Workflow, LocalEngineHandler):
     flow_name = 'weight_algo_slice'
     '''
     Flow arguments dict should have following keys:
      - algo_name
      - is_reference - whether reference metric values should be used
+     - engine (optional) - "dcn" (default) or "local" rating engine
     '''
     def stage_0(self):
         if 'algo_slice_id' not in self.arguments:
@@ -114,14 +151,13 @@ class RateAlgoSliceWorkflow(Workflow, TaskHandler):
         for metric_slice in algo_slice.metrics:
             metric = metric_slice.metric
             task_arguments['metrics'][metric.name] = {'value': metric_slice.result, 'weight': metric.weight}
-        task = Task.objects.create(
+        self.create_task(
             name='weight_metrics',
-            flow=self.flow,
             module='findus_edge.algo.metrics',
             function='weight',
+            arguments=task_arguments,
+            local_function=self.local_function(weight),
         )
-        task.arguments_dict = task_arguments
-        task.save()
         return True
 
     def stage_1(self):
@@ -138,23 +174,27 @@ class RateAlgoSliceWorkflow(Workflow, TaskHandler):
         return self.map_task_results([set_rate_value])
 
 
-class RateAllSlicesWorkflow(Workflow, ChildWorkflowHandler):
+class RateAllSlicesWorkflow(Workflow, ChildWorkflowHandler, LocalEngineHandler):
     flow_name = 'rate_all_algo_slices'
     '''
     Flow arguments dict should have following keys:
      - algo_name
      - is_reference - whether reference metric values should be used
+     - engine (optional) - "dcn" (default) creates rating child flow per slice,
+       "local" rates all slices in a single batch
     '''
     def stage_0(self):
         if 'algo_name' not in self.arguments:
             raise ValueError('"algo_name" is not defined for algorythm metrics based rate workflow')
         algo = Algo.objects.get(name=self.arguments['algo_name'])
-        algo_slices: List[AlgoSlice] = AlgoSlice.objects.filter(algo=algo, result__isnull=True)
-        for algo_slice in algo_slices:
-            workflow = RateAlgoSliceWorkflow()
-            flow = workflow.create()
-            workflow.arguments = {'algo_slice_id': algo_slice.id}
-            self.append_child_flow(flow)
+        if self.is_local_engine:
+            rate_slices(algo)
+            return True
+        algo_slices = AlgoSlice.objects.filter(algo=algo, result__isnull=True).values_list('id', flat=True)
+        self.create_child_flows(
+            RateAlgoSliceWorkflow,
+            [{'algo_slice_id': algo_slice_id, 'engine': DCN_ENGINE} for algo_slice_id in algo_slices]
+        )
         return True
 
     def stage_1(self):
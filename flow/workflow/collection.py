@@ -1,14 +1,23 @@
-from datetime import timedelta
+from datetime import datetime, time, timedelta
 from typing import Dict, List
 
 from django.utils.timezone import now
 
+from lib.trading_calendar import last_trading_day
 from flow.workflow.generic import Workflow, TaskHandler, ChildWorkflowHandler
 from flow.models import Flow
 from task.models import Task, TaskState
 from task.lib.processing import (append_prices, append_dividends, append_finviz_fundamental, append_new_tickers,
-                                 update_scope, define_ticker_daily_start_date)
-from ticker.models import Ticker
+                                 update_scope, define_ticker_daily_start_date, append_ticker_history_batch,
+                                 append_finviz_fundamental_batch, get_daily_start_date, get_ticker_daily_start_date)
+from ticker.models import Ticker, TickerSummary
+
+# Tickers per collection task, 1 keeps a dedicated flow and task per ticker
+DEFAULT_COLLECTION_BATCH_SIZE = 1
+
+
+def split_batches(symbols: List[str], batch_size: int) -> List[List[str]]:
+    return [symbols[idx:idx + batch_size] for idx in range(0, len(symbols), batch_size)]
 
 
 class ScopeUpdateWorkflow(Workflow, TaskHandler):
@@ -57,15 +66,60 @@ class AppendTickerPricesWorfklow(Workflow, TaskHandler):
         return self.map_task_results([append_prices, append_dividends])
 
 
+class AppendTickerPricesBatchWorkflow(Workflow, TaskHandler):
+    flow_name = 'append_ticker_price_data_batch'
+    '''
+    Flow arguments dict should have following keys:
+     - tickers - list of ticker symbols collected by a single DCN task
+    '''
+    def stage_0(self):
+        if 'tickers' not in self.arguments:
+            raise ValueError('Tickers are not defined for batch prices collection workflow')
+        tickers = list(Ticker.objects.filter(symbol__in=self.arguments['tickers']))
+        latest_price_dates = dict(
+            TickerSummary.objects.filter(ticker__in=tickers).values_list('ticker_id', 'latest_price_date')
+        )
+        batch = []
+        for ticker in tickers:
+            item = {'ticker': ticker.symbol}
+            if ticker.id in latest_price_dates:
+                start = get_daily_start_date(latest_price_dates[ticker.id])
+            else:  # Summary is missing until ticker data is ingested or refreshed
+                start = get_ticker_daily_start_date(ticker)
+            if start:
+                item['start'] = start
+            batch.append(item)
+        self.create_task(
+            name='get_ticker_prices_batch',
+            module='findus_edge.yahoo',
+            function='ticker_history_batch',
+            arguments={'tickers': batch},
+        )
+        return True
+
+    def stage_1(self):
+        return self.check_all_task_processed()
+
+    def stage_2(self):
+        return self.map_task_results([append_ticker_history_batch])
+
+
 class AddAllTickerPricesWorkflow(Workflow, ChildWorkflowHandler):
     flow_name = 'collect_daily_prices_global'
-
+    '''
+    Flow arguments dict may have following keys:
+     - batch_size - tickers per collection task (DEFAULT_COLLECTION_BATCH_SIZE by default)
+    '''
     def stage_0(self):
-        for ticker in [ticker.symbol for ticker in Ticker.objects.all()]:
-            workflow = AppendTickerPricesWorfklow()
-            flow = workflow.create()
-            workflow.arguments = {'ticker': ticker}
-            self.append_child_flow(flow)
+        # Tickers that already have prices of the last trading session are skipped
+        session = datetime.combine(last_trading_day(), time())
+        symbols = list(TickerSummary.tickers_without_prices_since(session).values_list('symbol', flat=True))
+        batch_size = self.arguments.get('batch_size', DEFAULT_COLLECTION_BATCH_SIZE)
+        if batch_size > 1:
+            batches = split_batches(symbols, batch_size)
+            self.create_child_flows(AppendTickerPricesBatchWorkflow, [{'tickers': batch} for batch in batches])
+        else:
+            self.create_child_flows(AppendTickerPricesWorfklow, [{'ticker': symbol} for symbol in symbols])
         return True
 
     def stage_1(self):
@@ -95,15 +149,46 @@ class AppendFinvizWorkflow(Workflow, TaskHandler):
         return self.map_task_results([append_finviz_fundamental])
 
 
+class AppendFinvizBatchWorkflow(Workflow, TaskHandler):
+    flow_name = 'append_finviz_fundamental_batch'
+    '''
+    Flow arguments dict should have following keys:
+     - tickers - list of ticker symbols collected by a single DCN task
+    '''
+    def stage_0(self):
+        if 'tickers' not in self.arguments:
+            raise ValueError('Tickers are not defined for batch Finviz fundamental data collection workflow')
+        self.create_task(
+            name='append_finviz_fundamental_batch',
+            module='findus_edge.finviz',
+            function='fundamental_converted_batch',
+            arguments={'tickers': [{'ticker': symbol} for symbol in self.arguments['tickers']]},
+        )
+        return True
+
+    def stage_1(self):
+        return self.check_all_task_processed()
+
+    def stage_2(self):
+        return self.map_task_results([append_finviz_fundamental_batch])
+
+
 class AddAllTickerFinvizWorkflow(Workflow, ChildWorkflowHandler):
     flow_name = 'collect_finviz_fundamental_global'
-
+    '''
+    Flow arguments dict may have following keys:
+     - batch_size - tickers per collection task (DEFAULT_COLLECTION_BATCH_SIZE by default)
+    '''
     def stage_0(self):
-        for ticker in [ticker.symbol for ticker in Ticker.objects.all()]:
-            workflow = AppendFinvizWorkflow()
-            flow = workflow.create()
-            workflow.arguments = {'ticker': ticker}
-            self.append_child_flow(flow)
+        today = now().replace(hour=0, minute=0, second=0, microsecond=0)
+        # Tickers with fundamental data collected today are skipped
+        symbols = list(TickerSummary.tickers_without_fundamental_since(today).values_list('symbol', flat=True))
+        batch_size = self.arguments.get('batch_size', DEFAULT_COLLECTION_BATCH_SIZE)
+        if batch_size > 1:
+            batches = split_batches(symbols, batch_size)
+            self.create_child_flows(AppendFinvizBatchWorkflow, [{'tickers': batch} for batch in batches])
+        else:
+            self.create_child_flows(AppendFinvizWorkflow, [{'ticker': symbol} for symbol in symbols])
         return True
 
     def stage_1(self):
@@ -1,28 +1,45 @@
-from typing import Callable, Dict, List, Iterable
+from typing import Callable, Dict, List, Iterable, Optional, Tuple, Type
 
-from django.db.models import Q
+from django.db.models import Q, QuerySet
+from django.utils.timezone import now
 
 from flow.models import Flow, FlowState
+from lib.notification import FLOW_CHANNEL, notify
 from task.models import Task, TaskState
 
 STAGE_COUNT_CAP = 100
+CHILD_FLOW_BATCH_SIZE = 1000
+
+# Flow name: workflow class, filled on workflow class creation
+WORKFLOW_REGISTRY: Dict[str, Type['Workflow']] = {}
 
 
 class Workflow:
     flow_name = 'generic'
+    # Ordered stage method names, compiled once per class
+    stages: Tuple[str, ...] = ()
+    stage_count = 0
 
     def __init__(self, flow: Flow = None):
         self.flow = flow
 
-    @property
-    def stage_count(self):
-        max_stage = 0
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.compile_stages()
+        # Mixins and intermediate classes inheriting flow name are not registered
+        if 'flow_name' in cls.__dict__:
+            WORKFLOW_REGISTRY[cls.flow_name] = cls
+
+    @classmethod
+    def compile_stages(cls):
+        stages = []
         for stage_id in range(STAGE_COUNT_CAP + 1):
-            try:
-                if getattr(self, f'stage_{stage_id}'):
-                    max_stage += 1
-            except AttributeError:
-                return max_stage
+            name = f'stage_{stage_id}'
+            if getattr(cls, name, None) is None:
+                break
+            stages.append(name)
+        cls.stages = tuple(stages)
+        cls.stage_count = len(stages)
 
     @property
     def stage(self):
@@ -43,7 +60,7 @@ class Workflow:
     @arguments.setter
     def arguments(self, _dict: Dict):
         self.flow.arguments_dict = _dict
-        self.flow.save()
+        self.flow.save_json()
 
     def validate_flow(self):
         if not self.flow:
@@ -67,9 +84,9 @@ class Workflow:
 
     def get_active_stage_method(self):
         self.validate_flow()
-        if self.flow.stage > self.stage_count:
+        if self.flow.stage >= self.stage_count:
             raise AttributeError('Flow active stage is more than total stage count')
-        return getattr(self, f'stage_{self.flow.stage}')
+        return getattr(self, self.stages[self.flow.stage])
 
     def create(self):
         self.flow = Flow.objects.create(name=self.flow_name)
@@ -79,21 +96,45 @@ class Workflow:
         return True
 
 
+Workflow.compile_stages()
+WORKFLOW_REGISTRY[Workflow.flow_name] = Workflow
+
+
 class TaskHandler:
 
     @property
     def tasks(self) -> List[Task]:
         return self.flow.task_set.all()
 
+    def create_task(self, name: str, module: str, function: str, arguments: Dict,
+                    local_function: Optional[Callable] = None) -> Task:
+        """
+        Creates flow task for DCN processing. If local function is provided,
+        task is processed in-process and created in PROCESSED state.
+        """
+        task = Task(name=name, flow=self.flow, module=module, function=function)
+        task.arguments_dict = arguments
+        if local_function:
+            task.result_dict = local_function(**task.arguments_dict)
+            task.state = TaskState.PROCESSED
+        task.save()
+        return task
+
     @property
     def undone_tasks(self) -> List[Task]:
         return self.flow.task_set.filter(~Q(processing_state=TaskState.DONE))
 
     def check_all_task_processed(self):
-        processed = self.flow.task_set.filter(processing_state=TaskState.PROCESSED)
-        # print((len(processed), len(self.undone_tasks)))
-        # print(len(processed) == len(self.undone_tasks))
-        return len(processed) == len(self.undone_tasks)
+        outstanding = self.flow.task_set.exclude(processing_state__in=(TaskState.PROCESSED, TaskState.DONE))
+        if not outstanding.exists():
+            return True
+        # Flow is not polled while waiting, task side releases it once the last task is processed
+        Flow.objects.filter(id=self.flow.id).update(waiting=now())
+        if outstanding.exists():
+            return False
+        # Tasks got processed before waiting mark became visible to task side
+        Flow.objects.filter(id=self.flow.id).update(waiting=None)
+        return True
 
     def map_task_results(self, func_list: List[Callable], interrupt_on_failure=False):
         all_pass = True
@@ -114,28 +155,25 @@ class TaskHandler:
 class ChildWorkflowHandler:
 
     @property
-    def child_flows_ids(self: Workflow):
-        if 'child_flow_ids' not in self.arguments:
-            self.arguments_update({'child_flow_ids': []})
-        return self.arguments.get('child_flow_ids')
-
-    @child_flows_ids.setter
-    def child_flows_ids(self: Workflow, id_list: list):
-        self.arguments_update({'child_flow_ids': id_list})
-
-    @property
-    def child_flows(self) -> Iterable[Flow]:
-        for flow_id in self.child_flows_ids:
-            yield Flow.objects.get(id=flow_id)
-
-    def append_child_flow(self, flow: Flow):
-        flows_ids = self.child_flows_ids
-        flows_ids.append(flow.id)
-        self.child_flows_ids = flows_ids
+    def child_flows(self: Workflow) -> QuerySet:
+        return self.flow.child_flows.all()
+
+    def create_child_flows(self: Workflow, workflow_class: Type[Workflow], arguments_list: Iterable[Dict]) -> int:
+        """
+        Creates child flows of workflow class with corresponding arguments in a single batch.
+        Returns created flow count.
+        """
+        flows = []
+        for arguments in arguments_list:
+            flow = Flow(name=workflow_class.flow_name, parent_flow=self.flow)
+            flow.arguments_dict = arguments
+            flow.encode_json()  # bulk create bypasses save
+            flows.append(flow)
+        Flow.objects.bulk_create(flows, batch_size=CHILD_FLOW_BATCH_SIZE)
+        if flows:  # bulk create bypasses post_save notifications
+            notify(FLOW_CHANNEL, FlowState.CREATED)
+        return len(flows)
 
     def check_child_flows_done(self):
-        for flow in self.child_flows:
-            if flow.processing_state != FlowState.DONE:
-                return False
-        else:
-            return True
+        # Deleted (cleaned up) children are done by definition
+        return not self.child_flows.exclude(processing_state=FlowState.DONE).exists()
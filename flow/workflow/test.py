@@ -22,6 +22,13 @@ class TestStagesWorklow(Workflow):
         return True
 
 
+class TestNestedStagesWorkflow(TestStagesWorklow):
+    flow_name = 'test_nested_stages'
+
+    def stage_5(self):
+        return True
+
+
 class TestRelayWorklow(Workflow):
     flow_name = 'test_relay'
 
@@ -0,0 +1,17 @@
+from statistics import median
+from time import perf_counter
+from typing import Callable, Dict
+
+
+def measure(func: Callable, repeat: int = 10) -> Dict[str, float]:
+    timings = []
+    for _ in range(repeat):
+        start = perf_counter()
+        func()
+        timings.append((perf_counter() - start) * 1000)
+    return {'min': min(timings), 'median': median(timings), 'max': max(timings)}
+
+
+def format_measurement(label: str, measurement: Dict[str, float]) -> str:
+    return (f'{label:<30} min {measurement["min"]:9.3f} ms | median {measurement["median"]:9.3f} ms | '
+            f'max {measurement["max"]:9.3f} ms')
@@ -1,8 +1,9 @@
 import logging
-from time import sleep
-from typing import Callable
+import time
+from typing import Callable, Dict, Iterator, List, Optional
 
-from task.lib.constants import IDLE_SLEEP_TIMEOUT
+from lib.notification import NotificationListener
+from task.lib.constants import IDLE_SLEEP_MIN_TIMEOUT, IDLE_SLEEP_TIMEOUT, QUOTA_GROWTH_LIMIT
 
 
 logger = logging.getLogger('task_processor')
@@ -12,23 +13,87 @@ class CommonServiceMixin:
     def __init__(self):
         self.idle = False
         self._active = True
+        self._idle_cycles = 0
+        self.base_quotas: Dict[str, int] = {}
+        self.quotas: Dict[str, int] = {}
+        self.stage_stats: Dict[str, Dict] = {}
+        self.listener: Optional[NotificationListener] = None
+
+    def init_quotas(self, quotas: Dict[str, int]):
+        self.base_quotas = dict(quotas)
+        self.quotas = dict(quotas)
 
     def init_cycle(self):
         self.idle = True
 
     def finalize_cycle(self):
+        if self.stage_stats:
+            logger.debug(f'Stage stats: {self.stage_stats}')
         if self.idle:
-            logger.debug('Processing cycle is idle.')
-            sleep(IDLE_SLEEP_TIMEOUT)
+            timeout = self.idle_timeout
+            logger.debug(f'Processing cycle is idle. Sleeping for {timeout} seconds')
+            self._idle_cycles += 1
+            self.sleep(timeout)
+        else:
+            self._idle_cycles = 0
 
-    def generic_stage_handler(self, func: Callable, state: str):
-        task_limit = self.quotas[state]
+    @property
+    def idle_timeout(self) -> float:
+        return min(IDLE_SLEEP_MIN_TIMEOUT * 2 ** self._idle_cycles, IDLE_SLEEP_TIMEOUT)
+
+    def sleep(self, timeout: float):
+        """
+        Idle sleep is interrupted by database notification of new work.
+        Without notifications (non-PostgreSQL database) services only poll with idle backoff,
+        as producers run in other processes and can not wake them up directly.
+        """
+        if self.listener and self.listener.listen():
+            if self.listener.wait(timeout):
+                logger.debug('Idle sleep is interrupted by notification')
+                self._idle_cycles = 0
+        else:
+            time.sleep(timeout)
+
+    def stage_items(self, state: str) -> Iterator:
+        """
+        Yields up to stage quota of queue items. Stops when queue is empty or started over from its head.
+        """
         queue = self.queues[state]
-        for _ in range(task_limit):
-            task = next(queue)
-            if task and self._active:
-                if func(task):
-                    self.idle = False
-                    return True
-            else:
-                return True
+        if hasattr(queue, 'page_size'):
+            # Lookahead row tells quota filled with more rows waiting apart from drained queue
+            queue.page_size = self.quotas[state] + 1
+        items = []
+        for _ in range(self.quotas[state]):
+            if not self._active or items and getattr(queue, 'tail_reached', False):
+                break
+            item = next(queue)
+            if not item or item in items:
+                break
+            items.append(item)
+            yield item
+        self.adapt_quota(state, len(items))
+
+    def adapt_quota(self, state: str, taken: int):
+        quota = self.quotas[state]
+        backlog = taken >= quota and not getattr(self.queues[state], 'tail_reached', False)
+        if backlog:
+            self.quotas[state] = min(quota * 2, self.base_quotas[state] * QUOTA_GROWTH_LIMIT)
+        elif not taken:
+            self.quotas[state] = max(quota // 2, self.base_quotas[state])
+        self.stage_stats[state] = {'quota': self.quotas[state], 'taken': taken, 'backlog': backlog}
+
+    def generic_stage_handler(self, func: Callable, state: str):
+        processed = 0
+        for item in self.stage_items(state):
+            if func(item):
+                processed += 1
+        if processed:
+            self.idle = False
+        return bool(processed)
+
+    def generic_batch_stage_handler(self, func: Callable[[List], bool], state: str):
+        batch = list(self.stage_items(state))
+        if batch and func(batch):
+            self.idle = False
+            return True
+        return False
@@ -1,9 +1,15 @@
 import logging
+import os
+import socket
+
+from collections import deque
+from contextlib import nullcontext
 from datetime import timedelta
 from time import sleep
-from typing import Callable, Generator
+from typing import Callable, Iterable, List, Optional, Tuple
 
-from django.db import connection, OperationalError
+from django.db import connection, transaction, OperationalError
+from django.db.models import Exists, Model, OuterRef, Q
 from django.db.models.query import QuerySet
 from django.utils.timezone import now
 
@@ -36,14 +42,111 @@ class DatabaseMixin:
         return True
 
 
-def generic_query_set_generator(query_getter: Callable) -> Generator:
-    while True:
-        query_set = query_getter()
-        if query_set:
-            for task in query_set:
-                yield task
+DEFAULT_PAGE_SIZE = 10
+CLAIM_LEASE = timedelta(minutes=5)
+# Flows waiting for tasks are polled again after this period even if task side did not release them
+FLOW_WAITING_RECHECK = timedelta(minutes=10)
+
+
+class QuerySetCursor:
+    """
+    Endless queue over a query set getter based on keyset pagination.
+    Rows are fetched in pages ordered by the query set ordering field (with primary key as tie-breaker),
+    continuing after the last yielded row. Once the tail is reached, cursor starts over from the head.
+    Yields None when query set is empty.
+    """
+    def __init__(self, query_getter: Callable[[], QuerySet], page_size: int = DEFAULT_PAGE_SIZE):
+        self.query_getter = query_getter
+        self.page_size = page_size
+        self._page = deque()
+        self._key = 'pk'
+        self._last: Optional[Tuple] = None
+        self._last_page_short = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> Optional[Model]:
+        if not self._page:
+            self._load_page()
+        if not self._page and self._last is not None:  # Tail is reached, starting over from the head
+            self._last = None
+            self._load_page()
+        if not self._page:
+            return None
+        item = self._page.popleft()
+        self._last = (getattr(item, self._key), item.pk)
+        return item
+
+    @property
+    def tail_reached(self) -> bool:
+        """
+        True when all rows up to the query set tail are yielded and next call starts over from the head.
+        """
+        return not self._page and self._last_page_short
+
+    def _load_page(self):
+        page = self.fetch_page()
+        self._last_page_short = len(page) < self.page_size
+        self._page.extend(page)
+
+    def page_query_set(self) -> QuerySet:
+        query_set = self.query_getter()
+        ordering = query_set.query.order_by
+        key = ordering[0] if ordering else 'pk'
+        if key.startswith('-'):
+            raise ValueError(f'Descending ordering "{key}" is not supported by query set cursor')
+        if key == query_set.model._meta.pk.name:
+            key = 'pk'
+        self._key = key
+        if key == 'pk':
+            query_set = query_set.order_by('pk')
+            if self._last is not None:
+                query_set = query_set.filter(pk__gt=self._last[1])
         else:
-            yield None
+            query_set = query_set.order_by(key, 'pk')
+            if self._last is not None:
+                value, pk = self._last
+                query_set = query_set.filter(Q(**{f'{key}__gt': value}) | Q(**{key: value, 'pk__gt': pk}))
+        return query_set
+
+    def fetch_page(self) -> List[Model]:
+        return list(self.page_query_set()[:self.page_size])
+
+
+class ClaimCursor(QuerySetCursor):
+    """
+    Query set cursor that claims every fetched page for the worker, so concurrent workers never receive same rows.
+    """
+    def __init__(self, query_getter: Callable[[], QuerySet], worker: str, page_size: int = DEFAULT_PAGE_SIZE):
+        super().__init__(query_getter, page_size)
+        self.worker = worker
+
+    def fetch_page(self) -> List[Model]:
+        return claim(self.page_query_set(), self.worker, self.page_size)
+
+
+def get_worker_id() -> str:
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def claim(query_set: QuerySet, worker: str, limit: int) -> List[Model]:
+    """
+    Atomically marks up to "limit" rows of the query set as claimed by the worker and returns them.
+    Rows claimed by other workers are skipped until their lease expires. Candidate rows are locked
+    with FOR UPDATE SKIP LOCKED where supported, conditional update keeps claiming exclusive on other backends.
+    """
+    available = Q(claimed_by__isnull=True) | Q(claimed_by=worker) | Q(claimed__lt=now() - CLAIM_LEASE)
+    candidates = query_set.filter(available)
+    skip_locked = connection.features.has_select_for_update_skip_locked
+    with transaction.atomic() if skip_locked else nullcontext():
+        if skip_locked:
+            candidates = candidates.select_for_update(skip_locked=True)
+        claim_ids = list(candidates.values_list('pk', flat=True)[:limit])
+        if not claim_ids:
+            return []
+        query_set.model.objects.filter(available, pk__in=claim_ids).update(claimed_by=worker, claimed=now())
+    return list(query_set.filter(pk__in=claim_ids, claimed_by=worker))
 
 
 def get_pending_tasks() -> QuerySet:
@@ -76,20 +179,24 @@ def get_overdue_tasks() -> QuerySet:
     return query_set
 
 
-def pending_tasks():
-    yield from generic_query_set_generator(get_pending_tasks)
+def pending_tasks(page_size: int = DEFAULT_PAGE_SIZE) -> QuerySetCursor:
+    return QuerySetCursor(get_pending_tasks, page_size)
+
+
+def claimed_pending_tasks(worker: str, page_size: int = DEFAULT_PAGE_SIZE) -> ClaimCursor:
+    return ClaimCursor(get_pending_tasks, worker, page_size)
 
 
-def running_tasks():
-    yield from generic_query_set_generator(get_running_tasks)
+def running_tasks(page_size: int = DEFAULT_PAGE_SIZE) -> QuerySetCursor:
+    return QuerySetCursor(get_running_tasks, page_size)
 
 
-def postponed_tasks():
-    yield from generic_query_set_generator(get_postponed_tasks)
+def postponed_tasks(page_size: int = DEFAULT_PAGE_SIZE) -> QuerySetCursor:
+    return QuerySetCursor(get_postponed_tasks, page_size)
 
 
-def overdue_tasks():
-    yield from generic_query_set_generator(get_overdue_tasks)
+def overdue_tasks(page_size: int = DEFAULT_PAGE_SIZE) -> QuerySetCursor:
+    return QuerySetCursor(get_overdue_tasks, page_size)
 
 
 def get_created_flows() -> QuerySet:
@@ -102,10 +209,30 @@ def get_created_flows() -> QuerySet:
 def get_running_flows() -> QuerySet:
     query_set = Flow.objects.filter(postponed__isnull=True)
     query_set = query_set.filter(processing_state=FlowState.RUNNING)
+    query_set = query_set.filter(Q(waiting__isnull=True) | Q(waiting__lt=now() - FLOW_WAITING_RECHECK))
     query_set = query_set.order_by('id')
     return query_set
 
 
+def release_waiting_flows(flow_ids: Iterable[int]) -> int:
+    """
+    Clears waiting mark of flows that have no outstanding (neither processed nor done) tasks.
+    Returns released flow count.
+    """
+    outstanding = Task.objects.filter(flow=OuterRef('pk')) \
+        .exclude(processing_state__in=(TaskState.PROCESSED, TaskState.DONE))
+    query_set = Flow.objects.filter(id__in=flow_ids, waiting__isnull=False).exclude(Exists(outstanding))
+    return query_set.update(waiting=None)
+
+
+def release_flow_on_save(sender, instance: Task, **kwargs):
+    """
+    Task post_save receiver releasing waiting flow of task processed outside of network client batches.
+    """
+    if instance.flow_id and instance.processing_state == TaskState.PROCESSED:
+        release_waiting_flows([instance.flow_id])
+
+
 def get_postponed_flows() -> QuerySet:
     query_set = Flow.objects.filter(postponed__lt=now())
     query_set = query_set.order_by('postponed')
@@ -0,0 +1,88 @@
+import json
+
+from typing import Callable, List
+
+
+class CachedJSON:
+    """
+    Decoded value of JSON text model field, cached per model instance.
+    Raw value is decoded once and assigned values are encoded only on save (see CachedJSONMixin).
+    Raw field assignment (e.g. refresh_from_db) replaces cached value.
+    Mutated value has to be assigned back to be saved.
+    """
+    def __init__(self, field: str, empty: Callable = dict):
+        self.field = field
+        self.empty = empty
+        self.cache_attr = None
+
+    def __set_name__(self, owner, name: str):
+        self.cache_attr = f'_{name}_cache'
+
+    def get_cached(self, instance):
+        """Returns (raw, value, changed) of up to date cache entry or None"""
+        cached = instance.__dict__.get(self.cache_attr)
+        if cached and cached[0] is getattr(instance, self.field):
+            return cached
+        return None
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        cached = self.get_cached(instance)
+        if cached is None:
+            raw = getattr(instance, self.field)
+            cached = (raw, json.loads(raw) if raw else self.empty(), False)
+            instance.__dict__[self.cache_attr] = cached
+        return cached[1]
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.cache_attr] = (getattr(instance, self.field), value, True)
+
+    def is_changed(self, instance) -> bool:
+        cached = self.get_cached(instance)
+        return bool(cached) and cached[2]
+
+    def encode(self, instance):
+        raw = json.dumps(instance.__dict__[self.cache_attr][1])
+        setattr(instance, self.field, raw)
+        instance.__dict__[self.cache_attr] = (raw, instance.__dict__[self.cache_attr][1], False)
+
+
+class CachedJSONMixin:
+    """
+    Model mixin encoding changed CachedJSON values into their fields on save.
+    Bulk operations bypass save, so encode_json has to be called before them.
+    """
+    @classmethod
+    def get_json_accessors(cls) -> List[CachedJSON]:
+        accessors = []
+        for klass in cls.__mro__:
+            accessors.extend(value for value in vars(klass).values() if isinstance(value, CachedJSON))
+        return accessors
+
+    def encode_json(self, fields=None) -> List[str]:
+        """
+        Encodes changed JSON values (limited to fields if provided). Returns encoded field names.
+        """
+        encoded = []
+        for accessor in self.get_json_accessors():
+            if (fields is None or accessor.field in fields) and accessor.is_changed(self):
+                accessor.encode(self)
+                encoded.append(accessor.field)
+        return encoded
+
+    def save(self, *args, **kwargs):
+        # Values of JSON fields excluded from update_fields stay changed until saved
+        self.encode_json(kwargs.get('update_fields'))
+        super().save(*args, **kwargs)
+
+    def save_json(self) -> List[str]:
+        """
+        Writes changed JSON fields only, unsaved instance is saved entirely. Returns encoded field names.
+        """
+        fields = self.encode_json()
+        if self.pk is None:
+            super().save()
+        elif fields:
+            super().save(update_fields=fields)
+        return fields
@@ -0,0 +1,107 @@
+import logging
+import select
+
+from time import monotonic
+from typing import Dict, Iterable
+
+from django.db import connection
+
+from flow.models import FlowState
+from task.models import TaskState
+
+logger = logging.getLogger('notification')
+
+TASK_CHANNEL = 'findus_task'
+FLOW_CHANNEL = 'findus_flow'
+SCHEDULE_CHANNEL = 'findus_schedule'
+# Saves in other states are not announced, since no service waits for them
+NOTIFIED_STATES = {
+    TASK_CHANNEL: (TaskState.CREATED, TaskState.PROCESSED),
+    FLOW_CHANNEL: (FlowState.CREATED, FlowState.DONE),
+}
+
+
+def notifications_supported() -> bool:
+    return connection.vendor == 'postgresql'
+
+
+def notify(channel: str, payload: str = ''):
+    if not notifications_supported():
+        return
+    # Postgres delivers notification once enclosing transaction is committed
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_notify(%s, %s)', [channel, payload])
+
+
+def notify_on_save(channel: str):
+    def receiver(sender, instance, **kwargs):
+        state = getattr(instance, 'processing_state', '')
+        if channel not in NOTIFIED_STATES or state in NOTIFIED_STATES[channel]:
+            notify(channel, state)
+    return receiver
+
+
+class NotificationListener:
+    """
+    Dedicated database connection subscribed to notification channels.
+    Channels are mapped to payloads (states) of interest, empty payload list subscribes for all notifications.
+    """
+    def __init__(self, channels: Dict[str, Iterable[str]]):
+        self.channels = {channel: set(payloads) for channel, payloads in channels.items()}
+        self._connection = None
+
+    @property
+    def listening(self) -> bool:
+        return self._connection is not None
+
+    def listen(self) -> bool:
+        if self.listening:
+            return True
+        if not notifications_supported():
+            return False
+        try:
+            self._connection = connection.get_new_connection(connection.get_connection_params())
+            self._connection.autocommit = True
+            with self._connection.cursor() as cursor:
+                for channel in self.channels:
+                    cursor.execute(f'LISTEN {channel}')
+        except connection.Database.Error:
+            logger.exception('Failed to subscribe for database notifications')
+            self.close()
+            return False
+        logger.info(f'Listening for notifications: {", ".join(self.channels)}')
+        return True
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Blocks until notification of interest is received or timeout expires. Returns True if notified.
+        """
+        if not self.listen():
+            return False
+        deadline = monotonic() + timeout
+        while (remaining := deadline - monotonic()) > 0:
+            try:
+                if select.select([self._connection], [], [], remaining) == ([], [], []):
+                    return False
+                self._connection.poll()
+                notifies = list(self._connection.notifies)
+                self._connection.notifies.clear()
+            except (connection.Database.Error, OSError):
+                logger.exception('Database notification connection failure')
+                self.close()
+                return False
+            if any(self.is_relevant(notification.channel, notification.payload) for notification in notifies):
+                return True
+        return False
+
+    def is_relevant(self, channel: str, payload: str) -> bool:
+        payloads = self.channels.get(channel)
+        return payloads is not None and (not payloads or payload in payloads)
+
+    def close(self):
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except connection.Database.Error:
+                pass
+        self._connection = None
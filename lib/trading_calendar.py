@@ -0,0 +1,83 @@
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from typing import FrozenSet, Optional
+
+# Daily prices of a session are considered available after NYSE close (16:00 ET) with a safety margin,
+# 21:00 UTC covers both daylight saving and standard time.
+SESSION_DATA_CUTOFF_UTC = time(21, 0)
+
+
+def easter(year: int) -> date:
+    """Gregorian Easter Sunday (anonymous Gregorian algorithm)"""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def nth_weekday(year: int, month: int, weekday: int, n: int) -> date:
+    """n-th weekday (0 - Monday) of the month, negative n counts from the month end"""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7 + 7 * (-n - 1))
+
+
+def observed(holiday: date) -> Optional[date]:
+    """Weekend holiday is observed on Friday before or Monday after"""
+    if holiday.weekday() == 5:
+        # NYSE does not close on Friday Dec 31 for New Year's Day falling on Saturday
+        if holiday.month == 1 and holiday.day == 1:
+            return None
+        return holiday - timedelta(days=1)
+    if holiday.weekday() == 6:
+        return holiday + timedelta(days=1)
+    return holiday
+
+
+@lru_cache(maxsize=None)
+def nyse_holidays(year: int) -> FrozenSet[date]:
+    holidays = [
+        observed(date(year, 1, 1)),  # New Year's Day
+        nth_weekday(year, 1, 0, 3),  # Martin Luther King Jr. Day
+        nth_weekday(year, 2, 0, 3),  # Washington's Birthday
+        easter(year) - timedelta(days=2),  # Good Friday
+        nth_weekday(year, 5, 0, -1),  # Memorial Day
+        observed(date(year, 7, 4)),  # Independence Day
+        nth_weekday(year, 9, 0, 1),  # Labor Day
+        nth_weekday(year, 11, 3, 4),  # Thanksgiving Day
+        observed(date(year, 12, 25)),  # Christmas Day
+    ]
+    if year >= 2022:
+        holidays.append(observed(date(year, 6, 19)))  # Juneteenth
+    return frozenset(holiday for holiday in holidays if holiday)
+
+
+def is_trading_day(day: date) -> bool:
+    return day.weekday() < 5 and day not in nyse_holidays(day.year)
+
+
+def previous_trading_day(day: date) -> date:
+    day -= timedelta(days=1)
+    while not is_trading_day(day):
+        day -= timedelta(days=1)
+    return day
+
+
+def last_trading_day(moment: datetime = None) -> date:
+    """
+    Returns the latest trading session date whose daily prices are expected to be available at the moment (UTC).
+    """
+    moment = moment or datetime.utcnow()
+    today = moment.date()
+    if is_trading_day(today) and moment.time() >= SESSION_DATA_CUTOFF_UTC:
+        return today
+    return previous_trading_day(today)
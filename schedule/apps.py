@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_save
 
 
 class ScheduleConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'schedule'
+
+    def ready(self):
+        from lib.notification import SCHEDULE_CHANNEL, notify_on_save
+        from schedule.models import Schedule
+        post_save.connect(notify_on_save(SCHEDULE_CHANNEL), sender=Schedule, weak=False, dispatch_uid='schedule_notification')
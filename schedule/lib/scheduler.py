@@ -1,6 +1,7 @@
 import logging
 from lib.common_service import CommonServiceMixin
-from lib.db import DatabaseMixin, generic_query_set_generator
+from lib.db import DatabaseMixin, QuerySetCursor
+from lib.notification import SCHEDULE_CHANNEL, NotificationListener
 # from task.lib.commands import COMMANDS, Command
 # from task.lib.commands import SystemTask
 from flow.models import Flow
@@ -21,8 +22,9 @@ def get_pending_schedules() -> QuerySet:
 class ScheduleProcessor(CommonServiceMixin, DatabaseMixin):
     def __init__(self):
         CommonServiceMixin.__init__(self)
-        self.queue = generic_query_set_generator(get_pending_schedules)
+        self.queue = QuerySetCursor(get_pending_schedules)
         self.workflow_map = get_workflow_map()
+        self.listener = NotificationListener({SCHEDULE_CHANNEL: ()})
 
     @staticmethod
     def clone(event: Event):
@@ -13,6 +13,7 @@ with open("settings.yaml", 'r') as fh:
 
 instance_type = os.getenv('INSTANCE_TYPE', 'docker')
 env_db_settings = os.getenv('DB_HOST', '127.0.0.1')
+price_store_root = os.getenv('PRICE_STORE_ROOT', '')  # columnar price store is disabled if empty
 
 db_host = 'database' if instance_type == 'docker' else env_db_settings
 db_creds = yaml_dict['database']
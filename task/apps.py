@@ -1,5 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_save
 
 
 class TaskConfig(AppConfig):
     name = 'task'
+
+    def ready(self):
+        from lib.db import release_flow_on_save
+        from lib.notification import TASK_CHANNEL, notify_on_save
+        from task.models import Task
+        post_save.connect(release_flow_on_save, sender=Task, dispatch_uid='task_flow_release')
+        post_save.connect(notify_on_save(TASK_CHANNEL), sender=Task, weak=False, dispatch_uid='task_notification')
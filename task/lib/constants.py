@@ -2,7 +2,13 @@ from flow.models import FlowState
 from task.models import Task, TaskState
 
 
-IDLE_SLEEP_TIMEOUT = 10  # seconds
+# Task processing engines: local engine runs function in-process instead of DCN round-trip
+LOCAL_ENGINE = 'local'
+DCN_ENGINE = 'dcn'
+
+IDLE_SLEEP_TIMEOUT = 10  # seconds, upper limit of idle backoff
+IDLE_SLEEP_MIN_TIMEOUT = 0.5  # seconds, first idle cycle sleep
+QUOTA_GROWTH_LIMIT = 8  # adaptive quota may grow up to base quota multiplied by this factor
 FLOW_PROCESSING_QUOTAS = {
     FlowState.CREATED: 1,
     FlowState.RUNNING: 4,
@@ -10,9 +16,9 @@ FLOW_PROCESSING_QUOTAS = {
     FlowState.POSTPONED: 100
 }
 TASK_PROCESSING_QUOTAS = {
-    TaskState.CREATED: 2,
+    TaskState.CREATED: 50,  # tasks published to DCN in a single batch
     TaskState.STARTED: 2,
-    TaskState.PROCESSED: 4,
+    TaskState.PROCESSED: 100,  # results drained from the broker in a single batch
     TaskState.DONE: 1,
     TaskState.POSTPONED: 100
 }
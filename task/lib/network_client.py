@@ -2,19 +2,31 @@ import json
 import logging
 
 from datetime import timedelta
-from typing import Dict
+from typing import Dict, List
 
+from django.db import transaction
 from django.utils.timezone import now
 
 from dcn.client.client import Client
 from task.lib.constants import TASK_PROCESSING_QUOTAS
-from lib.db import DatabaseMixin, overdue_tasks, pending_tasks, postponed_tasks, running_tasks
+from lib.db import (DatabaseMixin, claimed_pending_tasks, get_worker_id, overdue_tasks, postponed_tasks,
+                    release_waiting_flows, running_tasks)
 from lib.common_service import CommonServiceMixin
+from lib.notification import TASK_CHANNEL, NotificationListener, notify
 from task.models import Task, TaskState
 
 logger = logging.getLogger('dcn_client')
 
 OVERDUE = 'overdue'
+RESULT_UPDATE_BATCH_SIZE = 25  # results may carry long price histories
+
+
+def validate_result(dcn_task: Dict):
+    if dcn_task['status'] is False:
+        logger.error(f'Task "{dcn_task["id"]}" has failed with error: {dcn_task.get("resolution")}')
+        return False
+    else:
+        return True
 
 
 class NetworkClient(Client, CommonServiceMixin, DatabaseMixin):
@@ -27,18 +39,22 @@ class NetworkClient(Client, CommonServiceMixin, DatabaseMixin):
     ):
         super().__init__(name, token, dsp_host, dsp_port)
         CommonServiceMixin.__init__(self)
+        self.worker = get_worker_id()
         self.queues = {
-            TaskState.CREATED: pending_tasks(),
-            TaskState.STARTED: running_tasks(),
+            TaskState.CREATED: claimed_pending_tasks(self.worker, TASK_PROCESSING_QUOTAS[TaskState.CREATED]),
+            TaskState.STARTED: running_tasks(TASK_PROCESSING_QUOTAS[TaskState.STARTED]),
             TaskState.PROCESSED: self._pull_task_result(),
             OVERDUE: overdue_tasks(),  # TODO: not implemented
-            TaskState.POSTPONED: postponed_tasks(),
+            TaskState.POSTPONED: postponed_tasks(TASK_PROCESSING_QUOTAS[TaskState.POSTPONED]),
         }
-        self.quotas = TASK_PROCESSING_QUOTAS
+        self.init_quotas(TASK_PROCESSING_QUOTAS)
+        self.listener = NotificationListener({TASK_CHANNEL: (TaskState.CREATED,)})
+        self.batch_stages = (
+            (self.push_tasks_to_network, TaskState.CREATED),
+            (self.process_task_results_batch, TaskState.PROCESSED),
+        )
         self.stages = (
-            (self.push_task_to_network, TaskState.CREATED),
             # (self.finalize_task, OVERDUE),
-            (self.process_task_results, TaskState.PROCESSED),
             (self.process_postponed, TaskState.POSTPONED),
         )
 
@@ -52,39 +68,57 @@ class NetworkClient(Client, CommonServiceMixin, DatabaseMixin):
             yield task
 
     def process_task_results(self, dcn_task: Dict):
-
-        def validate_failure(dcn_task: Dict):
-            if dcn_task['status'] is False:
-                logger.error(f'Task "{dcn_task["id"]}" has failed with error: {dcn_task.get("resolution")}')
-                return False
+        return self.process_task_results_batch([dcn_task])
+
+    def process_task_results_batch(self, dcn_tasks: List[Dict]):
+        tasks: Dict[int, Task] = Task.objects.in_bulk([dcn_task['id'] for dcn_task in dcn_tasks])
+        processed, failed = {}, {}
+        for dcn_task in dcn_tasks:
+            task = tasks.get(dcn_task['id'])
+            if not task:
+                logger.warning(f'Results are received for unknown task "{dcn_task["id"]}"')
+                continue
+            logger.info(f'Task {task.name} execution results received')
+            if validate_result(dcn_task):
+                task.result = dcn_task['result']
+                task.state = TaskState.PROCESSED
+                processed[task.id] = task
             else:
-                return True
-
-        def append_result_to_db():
-            task.result = dcn_task['result']
-            task.state = TaskState.PROCESSED
-            task.save()
-            return True
-
-        task_id = dcn_task['id']
-        task: Task = Task.objects.get(pk=task_id)
-        logger.info(f'Task {task.name} execution results received')
-        if validate_failure(dcn_task):
-            return append_result_to_db()
-        else:
-            task.postponed = now() + timedelta(hours=1)
-            task.reset()
-            return False
-
+                task.postponed = now() + timedelta(hours=1)
+                task.reset(save=False)
+                failed[task.id] = task
+        with transaction.atomic():
+            Task.objects.bulk_update(processed.values(), ['result', 'processing_state'],
+                                     batch_size=RESULT_UPDATE_BATCH_SIZE)
+            Task.objects.bulk_update(failed.values(), ['postponed', 'sent', 'claimed_by', 'processing_state'],
+                                     batch_size=RESULT_UPDATE_BATCH_SIZE)
+        if processed:
+            # Flows waiting for these tasks are released after results are committed
+            release_waiting_flows({task.flow_id for task in processed.values() if task.flow_id})
+            notify(TASK_CHANNEL, TaskState.PROCESSED)  # bulk update bypasses post_save notifications
+        return bool(processed)
 
     def push_task_to_network(self, task: Task):
-        logger.info(f'Sending task: {task.name}')
-        dcn_task = task.compose_for_dcn(self.name)
-        dcn_task['client'] = self.broker.queue
-        self.broker.publish(dcn_task)
-        task.sent = now()
-        task.state = TaskState.STARTED
-        task.save()
+        return self.push_tasks_to_network([task])
+
+    def push_tasks_to_network(self, tasks: List[Task]):
+        logger.info(f'Sending {len(tasks)} task(s)')
+        published = []
+        try:
+            for task in tasks:
+                logger.debug(f'Sending task: {task.name}')
+                dcn_task = task.compose_for_dcn(self.name)
+                dcn_task['client'] = self.broker.queue
+                self.broker.publish(dcn_task)
+                published.append(task)
+        finally:
+            # Tasks published before a failure must not be sent again after claim lease expiration
+            sent = now()
+            Task.objects.filter(id__in=[task.id for task in published])\
+                .update(sent=sent, processing_state=TaskState.STARTED)
+            for task in published:
+                task.sent = sent
+                task.state = TaskState.STARTED
         return True
 
     def process_postponed(self, task: Task):
@@ -94,5 +128,7 @@ class NetworkClient(Client, CommonServiceMixin, DatabaseMixin):
         return True
 
     def processing_cycle(self):
+        for stage_handler, task_state in self.batch_stages:
+            self.generic_batch_stage_handler(stage_handler, task_state)
         for stage_handler, task_state in self.stages:
             self.generic_stage_handler(stage_handler, task_state)
@@ -3,14 +3,15 @@ import json
 import logging
 import sys
 import inspect
-from typing import Union
+from typing import Dict, Optional, Union
 
 from django.db import transaction
 
+from algo.cache import invalidate as invalidate_algo_cache
 from settings import log_path
 from schedule.lib.interface import Scheduler
 from task.models import Task
-from ticker.models import Ticker, FinvizFundamental, Scope
+from ticker.models import Ticker, Scope
 
 logger = logging.getLogger('task_processor')
 logger.debug(log_path)
@@ -30,15 +31,36 @@ def validate_result_json(task: Task):
         return False
 
 
+def report_ingestion(task: Task, key: str, inserted: int, skipped: int, save: bool = True):
+    logger.info(f'{key}: {inserted} row(s) inserted, {skipped} skipped')
+    result = task.result_dict
+    ingestion = result.get('ingestion', {})
+    ingestion[key] = {'inserted': inserted, 'skipped': skipped}
+    result['ingestion'] = ingestion
+    task.result_dict = result
+    if save:
+        task.save_json()
+
+
+def get_batch_tickers(task: Task) -> Dict[str, Ticker]:
+    symbols = [item['ticker'] for item in task.arguments_dict['tickers']]
+    tickers = {ticker.symbol: ticker for ticker in Ticker.objects.filter(symbol__in=symbols)}
+    for symbol in symbols:
+        if symbol not in tickers:
+            logger.warning(f'Ticker {symbol} of batch task {task} is missing')
+    return tickers
+
+
 def append_prices(task: Task):
     ticker_name = task.arguments_dict['ticker']
     logger.info(f'Processing prices for {ticker_name}')
     ticker = Ticker.objects.get(symbol=ticker_name)
     history = task.result_dict
     prices = history.get('prices', [])
-    for price_list in prices:
-        if not ticker.add_price(price_list):
-            return False
+    inserted = ticker.add_prices(prices)
+    if inserted:
+        invalidate_algo_cache()
+    report_ingestion(task, 'prices', inserted, len(prices) - inserted, save=False)  # persisted by set_done
     return True
 
 
@@ -48,9 +70,10 @@ def append_dividends(task: Task):
     ticker = Ticker.objects.get(symbol=ticker_name)
     history = task.result_dict
     dividends = history.get('dividends', [])
-    for dividend in dividends:
-        if not ticker.add_dividend(dividend):
-            return False
+    inserted = ticker.add_dividends(dividends)
+    if inserted:
+        invalidate_algo_cache()
+    report_ingestion(task, 'dividends', inserted, len(dividends) - inserted, save=False)  # persisted by set_done
     return True
 
 
@@ -59,9 +82,50 @@ def append_finviz_fundamental(task: Task):
     logger.info(f'Processing fundamental data from finviz for {ticker_name}')
     ticker = Ticker.objects.get(symbol=ticker_name)
     result = task.result_dict
-    result['values']['ticker'] = ticker
-    fundamental = FinvizFundamental(**result['values'])
-    fundamental.save()
+    ticker.add_fundamental(result['values'])
+    invalidate_algo_cache()
+    return True
+
+
+def append_ticker_history_batch(task: Task):
+    """
+    Fans batch ticker history result ({symbol: history}) out into per ticker price and dividend ingestion.
+    """
+    tickers = get_batch_tickers(task)
+    results = task.result_dict
+    updated = False
+    for symbol, ticker in tickers.items():
+        history = results.get(symbol)
+        if history is None:
+            logger.warning(f'History of {symbol} is missing in batch task {task} result')
+            continue
+        for key, add_function in (('prices', ticker.add_prices), ('dividends', ticker.add_dividends)):
+            rows = history.get(key, [])
+            inserted = add_function(rows)
+            updated = updated or bool(inserted)
+            report_ingestion(task, f'{symbol}:{key}', inserted, len(rows) - inserted, save=False)
+    if updated:
+        invalidate_algo_cache()
+    task.save_json()  # ingestion report is encoded once for the whole batch
+    return True
+
+
+def append_finviz_fundamental_batch(task: Task):
+    """
+    Fans batch Finviz result ({symbol: {'values': ...}}) out into per ticker fundamental ingestion.
+    """
+    tickers = get_batch_tickers(task)
+    results = task.result_dict
+    appended = 0
+    for symbol, ticker in tickers.items():
+        if not results.get(symbol, {}).get('values'):
+            logger.warning(f'Fundamental data of {symbol} is missing in batch task {task} result')
+            continue
+        ticker.add_fundamental(results[symbol]['values'])
+        appended += 1
+    if appended:
+        invalidate_algo_cache()
+    logger.info(f'Fundamental data is appended for {appended} of {len(tickers)} ticker(s)')
     return True
 
 
@@ -119,14 +183,14 @@ def get_all_tickers(task: Task):
     symbols = [ticker.symbol for ticker in tickers]
     arguments["ticker"] = symbols
     task.arguments_dict = arguments
-    task.save()
+    task.save_json()
     return True
 
 
 def clone_arguments_to_children(task):
     if task.arguments:
         for child_task in task.get_children():
-            child_task.arguments = task.arguments
+            child_task.arguments_dict = task.arguments_dict
             child_task.save()
     else:
         logger.warning(f'No arguments to clone from task: {task}')
@@ -137,16 +201,27 @@ def define_ticker_daily_start_date(task: Task):
     arguments = task.arguments_dict
     symbol = arguments['ticker']
     ticker = Ticker.objects.get(symbol=symbol)
-    if ticker.price_set.count():
-        latest_price = ticker.price_set.latest('date')
-        latest_date: datetime.datetime = latest_price.date + datetime.timedelta(days=1)
-        logger.debug(f'Latest price date for {symbol}: {latest_date}')
-        arguments['start'] = f'{latest_date.year}-{latest_date.month}-{latest_date.day}'
+    start = get_ticker_daily_start_date(ticker)
+    if start:
+        arguments['start'] = start
         task.arguments_dict = arguments
-        task.save()
+        task.save_json()
     return True
 
 
+def get_ticker_daily_start_date(ticker: Ticker) -> Optional[str]:
+    latest_price_date = ticker.latest_price_date()
+    logger.debug(f'Latest price date for {ticker.symbol}: {latest_price_date}')
+    return get_daily_start_date(latest_price_date)
+
+
+def get_daily_start_date(latest_price_date: Optional[datetime.datetime]) -> Optional[str]:
+    if not latest_price_date:
+        return None
+    latest_date: datetime.datetime = latest_price_date + datetime.timedelta(days=1)
+    return f'{latest_date.year}-{latest_date.month}-{latest_date.day}'
+
+
 def draft_get_param_for_algo(task: Task):
     with open('pe.txt', 'w') as fh:
         for tkr in tkrs:
@@ -0,0 +1,56 @@
+import logging
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils.timezone import now
+
+from lib.benchmark import format_measurement, measure
+from lib.db import (get_created_flows, get_done_flows, get_overdue_tasks, get_pending_tasks, get_postponed_flows,
+                    get_postponed_tasks, get_running_flows, get_running_tasks)
+from task.lib.constants import FLOW_PROCESSING_QUOTAS, TASK_PROCESSING_QUOTAS
+from task.models import Task, TaskState
+
+logger = logging.getLogger(__name__)
+
+INSERT_BATCH_SIZE = 10000
+POLL_LIMIT = max(list(FLOW_PROCESSING_QUOTAS.values()) + list(TASK_PROCESSING_QUOTAS.values()))
+
+
+class Command(BaseCommand):
+    help = 'Measure service polling query latency against a synthetic task table. All generated rows are rolled back.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000, help='Done task rows to generate')
+        parser.add_argument('--active', type=int, default=1000, help='Rows generated per active task state')
+        parser.add_argument('--repeat', type=int, default=20, help='Measurements per query')
+        parser.add_argument('--explain', action='store_true', help='Print query plans')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.populate(options['rows'], options['active'])
+            self.stdout.write(f'Task table rows: {Task.objects.count()}')
+            for query_getter in (get_pending_tasks, get_running_tasks, get_postponed_tasks, get_overdue_tasks,
+                                 get_created_flows, get_running_flows, get_postponed_flows, get_done_flows):
+                query_set = query_getter()[:POLL_LIMIT]
+                measurement = measure(lambda: list(query_set.all()), options['repeat'])
+                self.stdout.write(format_measurement(query_getter.__name__, measurement))
+                if options['explain']:
+                    self.stdout.write(query_set.explain())
+            transaction.set_rollback(True)
+
+    def populate(self, done_count: int, active_count: int):
+        timestamp = now()
+        done_postponed = timestamp + timedelta(days=92)
+        states = (
+            (done_count, {'processing_state': TaskState.DONE, 'postponed': done_postponed}),
+            (active_count, {'processing_state': TaskState.CREATED}),
+            (active_count, {'processing_state': TaskState.STARTED, 'sent': timestamp - timedelta(hours=2)}),
+            (active_count, {'processing_state': TaskState.CREATED, 'postponed': timestamp - timedelta(minutes=1)}),
+        )
+        for count, fields in states:
+            for offset in range(0, count, INSERT_BATCH_SIZE):
+                batch_size = min(INSERT_BATCH_SIZE, count - offset)
+                Task.objects.bulk_create(Task(name='benchmark', **fields) for _ in range(batch_size))
+            logger.debug(f'{count} task rows generated with {fields}')
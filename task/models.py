@@ -1,11 +1,12 @@
-import json
-
 from datetime import datetime, timedelta
 from typing import List
 
 from django.db import models
+from django.db.models import Q
 from django.utils.timezone import now
 
+from lib.json_cache import CachedJSON, CachedJSONMixin
+
 
 class TaskState:
     CREATED = 'created'
@@ -18,7 +19,7 @@ class TaskState:
     choices = ((state, state) for state in states)
 
 
-class Task(models.Model):
+class Task(CachedJSONMixin, models.Model):
 
     class Priorities(models.IntegerChoices):
         BLOCKING = 0
@@ -37,6 +38,18 @@ class Task(models.Model):
     module = models.CharField(max_length=100)
     function = models.CharField(max_length=100)
     result = models.TextField(default='{}')
+    claimed_by = models.CharField(max_length=100, null=True, help_text='Worker that claimed the task')
+    claimed = models.DateTimeField(null=True)
+
+    class Meta:
+        indexes = [
+            # pending/running/overdue polling: active tasks only, ordered by id or sent time
+            models.Index(fields=['processing_state', 'id'], condition=Q(postponed__isnull=True),
+                         name='task_active_state_id_idx'),
+            models.Index(fields=['processing_state', 'sent'], condition=Q(postponed__isnull=True),
+                         name='task_active_state_sent_idx'),
+            models.Index(fields=['postponed'], condition=Q(postponed__isnull=False), name='task_postponed_idx'),
+        ]
 
     @property
     def state(self):
@@ -49,24 +62,8 @@ class Task(models.Model):
     def state(self, state: str):
         self.processing_state = state
 
-    @property
-    def arguments_dict(self):
-        return json.loads(self.arguments)
-
-    @arguments_dict.setter
-    def arguments_dict(self, _dict: dict):
-        self.arguments = json.dumps(_dict)
-
-    @property
-    def result_dict(self):
-        if self.result:
-            return json.loads(self.result)
-        else:
-            return dict()
-
-    @result_dict.setter
-    def result_dict(self, _dict: dict):
-        self.result = json.dumps(_dict)
+    arguments_dict = CachedJSON('arguments')
+    result_dict = CachedJSON('result')
 
     @property
     def postponed_relative(self):
@@ -88,15 +85,18 @@ class Task(models.Model):
             'arguments': self.arguments_dict
         }
 
-    def reset(self):
+    def reset(self, save: bool = True):
         self.sent = None
+        self.claimed_by = None
         self.state = TaskState.CREATED
-        self.save()
+        if save:
+            self.save()
 
     def set_done(self):
         self.state = TaskState.DONE
         self.postponed = now() + timedelta(days=92)
-        self.save()
+        # Result is not rewritten unless changed by post-processing
+        self.save(update_fields=['processing_state', 'postponed', *self.encode_json()])
 
     def __str__(self):
         return f'({self.id}) "{self.name}"'
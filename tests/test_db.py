@@ -0,0 +1,44 @@
+import logging
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from django.db import connection
+from django.utils.timezone import now
+
+from lib.db import claim, get_pending_tasks
+from task.models import Task, TaskState
+
+logger = logging.getLogger(__name__)
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.mark.skipif(connection.vendor != 'postgresql', reason='Concurrent row claiming requires PostgreSQL')
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_task_claiming():
+    task_count, worker_count, batch_size = 200, 4, 7
+    task_ids = {Task.objects.create(name='pytest', module='findus_edge.stub', function='relay').id
+                for _ in range(task_count)}
+
+    def claim_all(worker: str):
+        claimed = []
+        try:
+            while batch := claim(get_pending_tasks(), worker, batch_size):
+                claimed.extend(task.id for task in batch)
+                # Claimed tasks leave pending queue same way as published ones
+                for task in batch:
+                    task.sent = now()
+                    task.state = TaskState.STARTED
+                    task.save()
+        finally:
+            connection.close()
+        return claimed
+
+    with ThreadPoolExecutor(max_workers=worker_count) as executor:
+        results = list(executor.map(claim_all, [f'pytest_worker_{idx}' for idx in range(worker_count)]))
+    claimed_ids = [task_id for result in results for task_id in result]
+    logger.info(f'Claimed per worker: {[len(result) for result in results]}')
+    assert len(claimed_ids) == len(set(claimed_ids)), 'Same task is claimed by several workers'
+    assert set(claimed_ids) == task_ids, 'Not all pending tasks are claimed'
@@ -1,13 +1,17 @@
 import logging
 
 from datetime import timedelta
-from time import sleep
+from time import monotonic, sleep
 from typing import Union
 
 import pytest
 
+from django.db import connection
 from django.utils.timezone import now
 
+from flow.models import FlowState
+from lib.notification import (FLOW_CHANNEL, SCHEDULE_CHANNEL, TASK_CHANNEL, NotificationListener,
+                              notifications_supported)
 from task.lib.network_client import NetworkClient
 from task.models import Task, TaskState
 
@@ -74,6 +78,52 @@ def test_task_forwarding(network_client_on_dispatcher: NetworkClient):
     assert task.state == TaskState.PROCESSED, f'Task result is processed but not marked as processed'
 
 
+def test_batch_task_push(network_client_on_dispatcher: NetworkClient):
+    client = network_client_on_dispatcher
+    tasks = [create_task(arguments={"arg": idx}) for idx in range(5)]
+    client.generic_batch_stage_handler(client.push_tasks_to_network, TaskState.CREATED)
+    for task in tasks:
+        task.refresh_from_db()
+        assert task.state == TaskState.STARTED, f'Task {task} is not started after batch push'
+        assert task.sent, f'Task {task} is send to DCN but not marked as sent'
+    assert not next(client.queues[TaskState.CREATED]), 'Unexpected network task received'
+
+
+def test_batch_push_failure(network_client_on_dispatcher: NetworkClient, monkeypatch):
+    client = network_client_on_dispatcher
+    tasks = [create_task(arguments={"arg": idx}) for idx in range(4)]
+    publish = client.broker.publish
+
+    def failing_publish(dcn_task):
+        if dcn_task['id'] == tasks[2].id:
+            raise ConnectionError('Broker connection is lost')
+        publish(dcn_task)
+
+    monkeypatch.setattr(client.broker, 'publish', failing_publish)
+    with pytest.raises(ConnectionError):
+        client.push_tasks_to_network(tasks)
+    for task in tasks:
+        task.refresh_from_db()
+    assert [task.state for task in tasks] == [TaskState.STARTED] * 2 + [TaskState.CREATED] * 2, \
+        'Published tasks are not marked as started on batch failure'
+
+
+def test_batch_result_processing(network_client_on_dispatcher: NetworkClient):
+    client = network_client_on_dispatcher
+    tasks = [create_task(arguments={"arg": idx}) for idx in range(4)]
+    failed_task = create_task(function='negative', arguments={"arg": "test"})
+    client.generic_batch_stage_handler(client.push_tasks_to_network, TaskState.CREATED)
+    sleep(0.1)
+    client.generic_batch_stage_handler(client.process_task_results_batch, TaskState.PROCESSED)
+    for task in tasks:
+        task.refresh_from_db()
+        assert task.state == TaskState.PROCESSED, f'Task {task} result is processed but not marked as processed'
+    failed_task.refresh_from_db()
+    assert failed_task.state == TaskState.POSTPONED, 'Failed task is not postponed'
+    assert failed_task.processing_state == TaskState.CREATED, 'Failed task is not reset for rerun'
+    assert not next(client.queues[TaskState.PROCESSED]), 'Unexpected task is received from DCN'
+
+
 @pytest.mark.parametrize('target_state', [
     pytest.param(TaskState.CREATED),
     pytest.param(TaskState.STARTED),
@@ -154,3 +204,31 @@ def test_task_retry_flow(network_client_on_dispatcher: NetworkClient):
         logger.debug(task.state)
     assert task.state == TaskState.PROCESSED, 'Failed to complete rescheduled task'
 
+
+def test_notification_fallback():
+    listener = NotificationListener({TASK_CHANNEL: (TaskState.CREATED,), SCHEDULE_CHANNEL: ()})
+    assert listener.is_relevant(TASK_CHANNEL, TaskState.CREATED), 'Subscribed state is not relevant'
+    assert not listener.is_relevant(TASK_CHANNEL, TaskState.STARTED), 'Unsubscribed state is relevant'
+    assert listener.is_relevant(SCHEDULE_CHANNEL, ''), 'Channel without payload filter is not relevant'
+    assert not listener.is_relevant(FLOW_CHANNEL, FlowState.DONE), 'Unsubscribed channel is relevant'
+    if notifications_supported():
+        return
+    assert not listener.listen(), 'Listener is subscribed without database notification support'
+    start = monotonic()
+    assert not listener.wait(0.2), 'Listener reported notification without subscription'
+    assert monotonic() - start < 0.1, 'Listener blocked instead of falling back to polling'
+
+
+@pytest.mark.skipif(connection.vendor != 'postgresql', reason='LISTEN/NOTIFY requires PostgreSQL')
+@pytest.mark.django_db(transaction=True)
+def test_task_creation_notification():
+    listener = NotificationListener({TASK_CHANNEL: (TaskState.CREATED,)})
+    assert listener.listen(), 'Failed to subscribe for task notifications'
+    try:
+        assert not listener.wait(0.5), 'Notification received without task changes'
+        start = monotonic()
+        create_task()
+        assert listener.wait(5), 'Task creation notification is not received'
+        assert monotonic() - start < 1, 'Notification delivery is delayed'
+    finally:
+        listener.close()
@@ -1,8 +1,18 @@
 import logging
 
+from datetime import datetime, timedelta
+
+import numpy as np
 import pytest
 
-from ticker.models import Ticker
+from django.core.management import call_command
+from django.db import connection
+
+from task.lib.processing import (append_dividends, append_finviz_fundamental_batch, append_ticker_history_batch,
+                                 define_ticker_daily_start_date)
+from task.models import Task
+from ticker import partitioning, price_store
+from ticker.models import Price, Ticker, TickerSummary
 
 logger = logging.getLogger(__name__)
 
@@ -36,3 +46,151 @@ def test_ticker_dividend_append(ticker_sample: Ticker):
     assert ticker_sample.dividend_set.count() == len(DIVIDEND_TEST_DATA), \
         'Dividend count mismatch for sample ticket. ' \
         f'Expected: {len(DIVIDEND_TEST_DATA)}, actual: {ticker_sample.dividend_set.count()}'
+
+
+def test_ticker_price_bulk_append(ticker_sample: Ticker):
+    ticker_sample.add_price(DAILY_TEST_DATA[0])
+    inserted = ticker_sample.add_prices(DAILY_TEST_DATA + DAILY_TEST_DATA[-1:])
+    assert inserted == len(DAILY_TEST_DATA) - 1, f'Unexpected inserted price count: {inserted}'
+    assert ticker_sample.price_set.count() == len(DAILY_TEST_DATA), \
+        'Price count mismatch for sample ticket. ' \
+        f'Expected: {len(DAILY_TEST_DATA)}, actual: {ticker_sample.price_set.count()}'
+    assert ticker_sample.add_prices(DAILY_TEST_DATA) == 0, 'Duplicate prices are inserted'
+
+
+def test_ticker_dividend_overlap_ingestion(ticker_sample: Ticker, django_assert_num_queries):
+    ticker_sample.add_dividends(DIVIDEND_TEST_DATA[:2])
+    task = Task.objects.create(name='pytest')
+    task.arguments_dict = {'ticker': ticker_sample.symbol}
+    task.result_dict = {'dividends': DIVIDEND_TEST_DATA}
+    task.save()
+    assert append_dividends(task), 'Partially overlapping dividends are not appended'
+    assert ticker_sample.dividend_set.count() == len(DIVIDEND_TEST_DATA), \
+        'Dividend count mismatch for sample ticket. ' \
+        f'Expected: {len(DIVIDEND_TEST_DATA)}, actual: {ticker_sample.dividend_set.count()}'
+    with django_assert_num_queries(1):  # ingestion report is written with task completion only
+        task.set_done()
+    task.refresh_from_db()
+    report = task.result_dict['ingestion']['dividends']
+    assert report == {'inserted': len(DIVIDEND_TEST_DATA) - 2, 'skipped': 2}, f'Unexpected ingestion report: {report}'
+
+
+def test_ticker_price_history_store(ticker_sample: Ticker, settings, tmp_path,
+                                    django_capture_on_commit_callbacks):
+    ticker_sample.add_prices(DAILY_TEST_DATA[1:])
+    database_history = ticker_sample.price_history()
+    assert len(database_history['date']) == len(DAILY_TEST_DATA) - 1, 'Price history length mismatch'
+    settings.PRICE_STORE_ROOT = str(tmp_path)
+    with django_capture_on_commit_callbacks(execute=True) as callbacks:
+        ticker_sample.add_prices(DAILY_TEST_DATA[:1])  # earlier date is inserted before stored ones
+        assert not price_store.get_path(ticker_sample.id).exists(), 'Price store is synced before commit'
+    assert len(callbacks) == 1, 'Price store sync is not scheduled on commit'
+    assert price_store.get_path(ticker_sample.id).exists(), 'Price store is not synced on commit'
+    history = ticker_sample.price_history()
+    assert isinstance(history['close'], np.memmap), 'Price history is not memory-mapped'
+    expected_dates = np.array([row[0] for row in DAILY_TEST_DATA], dtype='datetime64[s]')
+    assert (history['date'] == expected_dates).all(), 'Price history dates mismatch'
+    for idx, column in enumerate(('open', 'high', 'low', 'close', 'volume'), start=1):
+        assert history[column].tolist() == [row[idx] for row in DAILY_TEST_DATA], f'Price {column} mismatch'
+    assert not ticker_sample.add_prices(DAILY_TEST_DATA), 'Duplicated prices are inserted'
+    settings.PRICE_STORE_ROOT = ''
+    assert ticker_sample.price_history()['close'].tolist() == history['close'].tolist(), \
+        'Database and store price history differs'
+
+
+def test_ticker_latest_price_date(ticker_sample: Ticker):
+    assert ticker_sample.latest_price_date() is None, 'Latest price date of ticker without prices'
+    recent = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=3)
+    ticker_sample.add_prices(DAILY_TEST_DATA + [[recent.isoformat(), 1, 1, 1, 1, 1]])
+    assert ticker_sample.latest_price_date() == recent, 'Recent latest price date mismatch'
+    Price.objects.filter(date=recent).delete()
+    TickerSummary.refresh([ticker_sample.id])  # summary is maintained by ingestion only
+    ticker_sample.refresh_from_db()
+    assert ticker_sample.latest_price_date() == datetime.fromisoformat(DAILY_TEST_DATA[-1][0]), \
+        'Outdated latest price date mismatch'
+    prices = ticker_sample.prices_between(datetime(2022, 6, 25), datetime(2022, 6, 28))
+    assert [price.close for price in prices] == [DAILY_TEST_DATA[1][4]], 'Price range is not applied'
+    task = Task.objects.create(name='define_start_date')
+    task.arguments_dict = {'ticker': ticker_sample.symbol}
+    define_ticker_daily_start_date(task)
+    assert task.arguments_dict['start'] == '2022-6-29', 'Daily prices start date is invalid'
+
+
+@pytest.mark.skipif(connection.vendor != 'postgresql', reason='Table partitioning requires PostgreSQL')
+def test_price_partitioning(ticker_sample: Ticker):
+    ticker_sample.add_prices(DAILY_TEST_DATA)
+    call_command('partition_timeseries', first_year=2020)
+    assert partitioning.is_partitioned(Price), 'Price table is not partitioned'
+    assert f'{Price._meta.db_table}_y{datetime.now().year + 1}' in partitioning.existing_partitions(Price), \
+        'Upcoming year partition is missing'
+    call_command('partition_timeseries')  # rerun only ensures upcoming partitions
+    assert ticker_sample.price_set.count() == len(DAILY_TEST_DATA), 'Prices are lost on partitioning'
+    assert not ticker_sample.add_prices(DAILY_TEST_DATA), 'Unique ticker date constraint is lost'
+    assert ticker_sample.add_prices([['2019-01-02', 1, 1, 1, 1, 1]]), 'History partition does not accept prices'
+    assert ticker_sample.latest_price_date() == datetime.fromisoformat(DAILY_TEST_DATA[-1][0])
+    beyond = datetime(datetime.now().year + 5, 1, 2)
+    assert ticker_sample.add_prices([[beyond.isoformat(), 1, 1, 1, 1, 1]]), \
+        'Price beyond created partitions is not inserted'
+    assert f'{Price._meta.db_table}_y{beyond.year}' not in partitioning.existing_partitions(Price)
+    partitioning.create_partitions(Price, beyond.year, beyond.year)
+    assert Price.objects.filter(ticker=ticker_sample, date=beyond).exists(), 'Default partition rows are lost'
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT COUNT(*) FROM {Price._meta.db_table}_{partitioning.DEFAULT_PARTITION}')
+        assert cursor.fetchone()[0] == 0, 'Rows are not moved from default partition'
+
+
+def test_ticker_summary(ticker_sample: Ticker):
+    ticker_sample.add_prices(DAILY_TEST_DATA[1:])
+    ticker_sample.add_prices(DAILY_TEST_DATA)  # earlier date does not move latest price
+    ticker_sample.add_dividends(DIVIDEND_TEST_DATA)
+    fundamental = ticker_sample.add_fundamental({'price_earnings': 10})
+    summary = TickerSummary.objects.get(ticker=ticker_sample)
+    assert summary.price_count == len(DAILY_TEST_DATA), 'Summary price count mismatch'
+    assert summary.latest_price_date == datetime.fromisoformat(DAILY_TEST_DATA[-1][0]), 'Latest price date mismatch'
+    assert summary.latest_close == DAILY_TEST_DATA[-1][4], 'Latest close mismatch'
+    assert summary.latest_price_id == ticker_sample.price_set.latest('date').id, 'Latest price id mismatch'
+    assert summary.dividend_count == len(DIVIDEND_TEST_DATA), 'Summary dividend count mismatch'
+    assert summary.latest_dividend_date == datetime.fromisoformat(DIVIDEND_TEST_DATA[-1][0])
+    assert summary.latest_fundamental_id == fundamental.id, 'Latest fundamental mismatch'
+    fields = [field.name for field in TickerSummary._meta.fields if field.name != 'updated']
+    refreshed = TickerSummary.refresh([ticker_sample.id])[0]
+    assert [getattr(refreshed, field) for field in fields] == [getattr(summary, field) for field in fields], \
+        'Maintained summary differs from recalculated one'
+    outdated = Ticker.objects.create(symbol='OUTDTD')
+    stale = TickerSummary.tickers_without_prices_since(datetime.fromisoformat(DAILY_TEST_DATA[-1][0]))
+    assert list(stale) == [outdated], 'Tickers with current prices are not skipped'
+
+
+def test_ticker_history_batch_ingestion(ticker_sample: Ticker):
+    other = Ticker.objects.create(symbol='OTHER')
+    ticker_sample.add_prices(DAILY_TEST_DATA[:1])
+    task = Task.objects.create(name='get_ticker_prices_batch')
+    task.arguments_dict = {'tickers': [{'ticker': ticker_sample.symbol}, {'ticker': other.symbol}, {'ticker': 'MISS'}]}
+    task.result_dict = {
+        ticker_sample.symbol: {'prices': DAILY_TEST_DATA, 'dividends': DIVIDEND_TEST_DATA},
+        other.symbol: {'prices': DAILY_TEST_DATA[:2], 'dividends': []},
+    }
+    task.save()
+    assert append_ticker_history_batch(task), 'Batch history ingestion failed'
+    assert ticker_sample.price_set.count() == len(DAILY_TEST_DATA), 'Batch prices are not ingested'
+    assert ticker_sample.dividend_set.count() == len(DIVIDEND_TEST_DATA), 'Batch dividends are not ingested'
+    assert other.price_set.count() == 2, 'Prices are not fanned out per ticker'
+    ingestion = task.result_dict['ingestion']
+    assert ingestion[f'{ticker_sample.symbol}:prices'] == {'inserted': len(DAILY_TEST_DATA) - 1, 'skipped': 1}
+    assert ingestion[f'{other.symbol}:dividends'] == {'inserted': 0, 'skipped': 0}
+
+
+def test_finviz_fundamental_batch_ingestion(ticker_sample: Ticker):
+    other = Ticker.objects.create(symbol='OTHER')
+    task = Task.objects.create(name='get_finviz_fundamental_batch')
+    task.arguments_dict = {'tickers': [{'ticker': ticker_sample.symbol}, {'ticker': other.symbol}, {'ticker': 'MISS'}]}
+    task.result_dict = {
+        ticker_sample.symbol: {'values': {'price_earnings': 10, 'price_sales': 2}},
+        other.symbol: {'values': {}},
+    }
+    task.save()
+    assert append_finviz_fundamental_batch(task), 'Batch fundamental ingestion failed'
+    fundamental = ticker_sample.finvizfundamental_set.get()
+    assert (fundamental.price_earnings, fundamental.price_sales) == (10, 2), 'Batch fundamental values mismatch'
+    assert ticker_sample.summary_or_none.latest_fundamental_id == fundamental.id, 'Ticker summary is not updated'
+    assert not other.finvizfundamental_set.exists(), 'Fundamental is created from empty values'
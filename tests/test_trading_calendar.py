@@ -0,0 +1,25 @@
+from datetime import date, datetime
+
+import pytest
+
+from lib.trading_calendar import is_trading_day, last_trading_day, nyse_holidays
+
+
+def test_nyse_holidays():
+    assert nyse_holidays(2024) == {
+        date(2024, 1, 1), date(2024, 1, 15), date(2024, 2, 19), date(2024, 3, 29), date(2024, 5, 27),
+        date(2024, 6, 19), date(2024, 7, 4), date(2024, 9, 2), date(2024, 11, 28), date(2024, 12, 25),
+    }, 'NYSE holidays of 2024 mismatch'
+    assert date(2021, 12, 31) not in nyse_holidays(2021), 'Saturday New Year is observed on Friday'
+    assert date(2022, 6, 20) in nyse_holidays(2022), 'Sunday Juneteenth is not observed on Monday'
+    assert not is_trading_day(date(2024, 7, 6)), 'Saturday is a trading day'
+
+
+@pytest.mark.parametrize("moment, expected", [
+    pytest.param(datetime(2024, 7, 3, 22), date(2024, 7, 3), id="after_close"),
+    pytest.param(datetime(2024, 7, 3, 15), date(2024, 7, 2), id="before_close"),
+    pytest.param(datetime(2024, 7, 5, 10), date(2024, 7, 3), id="after_holiday"),
+    pytest.param(datetime(2024, 7, 8, 10), date(2024, 7, 5), id="after_weekend"),
+])
+def test_last_trading_day(moment: datetime, expected: date):
+    assert last_trading_day(moment) == expected, 'Last trading session mismatch'
@@ -1,20 +1,28 @@
 import json
 import logging
 
+from datetime import timedelta
 from time import monotonic, sleep
 from typing import List
 
 import pytest
 
+from django.utils.timezone import now
+
 from algo.algorithm.test import TestAlgorithm
 from algo.algorithm.generic import Algorithm
+from algo import cache as algo_cache
 from algo.models import Algo, AlgoMetric, AlgoSlice
+from algo.processing import append_slices
+from algo.rating import rate_slices
 from flow.lib.flow_processor import FlowProcessor
 from flow.workflow import CalculateAlgoMetricsWorkflow, ApplyAlgoMetricsWorkflow, RateAlgoSliceWorkflow, RateAllSlicesWorkflow
+from task.lib.constants import LOCAL_ENGINE
 from task.lib.network_client import NetworkClient
-from task.models import TaskState
-from tests.test_algo.conftest import algo_scope
-from ticker.models import Scope, Ticker
+from task.lib.processing import append_finviz_fundamental
+from task.models import Task, TaskState
+from tests.tests_algo.conftest import algo_scope
+from ticker.models import FinvizFundamental, Scope, Ticker
 
 logger = logging.getLogger(__name__)
 
@@ -57,6 +65,90 @@ def cleanup_algo_slices(algorithm: Algorithm):
     yield algorithm
 
 
+def test_normalization_data_latest_slice(algorithm: Algorithm, django_assert_num_queries):
+    metric: AlgoMetric = algorithm.algo.metrics.get(name='price_earnings')
+    outdated = FinvizFundamental.objects.get(ticker__symbol='1')
+    latest = FinvizFundamental.objects.create(ticker=outdated.ticker, price_earnings=100)
+    FinvizFundamental.objects.create(ticker=Ticker.objects.get(symbol='2'), price_earnings=None)
+    FinvizFundamental.objects.create(ticker=Ticker.objects.create(symbol='OUT'), price_earnings=1)
+    expected = {
+        fundamental.id: fundamental.price_earnings
+        for fundamental in FinvizFundamental.objects.filter(ticker__scope=algorithm.scope)
+        if fundamental.ticker.symbol not in ('1', '2')
+    }
+    expected[latest.id] = latest.price_earnings
+    assert metric.algo.reference_scope == algorithm.scope
+    with django_assert_num_queries(1):
+        data = metric.get_normalization_data()
+    assert data == expected, 'Normalization data does not correspond to latest ticker slices'
+    metric.min_threshold = 4
+    metric.max_threshold = 50
+    data = metric.get_normalization_data()
+    assert data == {idx: value for idx, value in expected.items() if 4 <= value <= 50}, \
+        'Normalization data thresholds are not applied'
+
+
+def test_bulk_slice_append(algorithm: Algorithm, django_assert_max_num_queries):
+    algo = algorithm.algo
+    fundamentals = list(FinvizFundamental.objects.filter(ticker__scope=algorithm.scope))
+    existing = AlgoSlice.objects.create(algo=algo, ticker=fundamentals[0].ticker, date=now().date())
+    for metric in algo.metrics:
+        task = Task.objects.create(name='append_slices')
+        task.arguments_dict = {'metric_id': metric.id}
+        task.result_dict = {'result': {str(fundamental.id): fundamental.id / 10 for fundamental in fundamentals}}
+        task.save()
+        with django_assert_max_num_queries(12):
+            assert append_slices(task), 'Slice append is failed'
+    for fundamental in fundamentals:
+        algo_slices = list(algo.get_slices_by_ticker(fundamental.ticker))
+        assert len(algo_slices) == 1, f'Single slice is expected for ticker {fundamental.ticker}'
+        assert sorted(metric_slice.result for metric_slice in algo_slices[0].metrics) == \
+               [fundamental.id / 10] * 2, f'Metric slices mismatch for ticker {fundamental.ticker}'
+    assert algo.get_slices_by_ticker(fundamentals[0].ticker).get() == existing, 'Existing slice is not reused'
+
+
+def test_latest_instance_single_query(algorithm: Algorithm, django_assert_num_queries):
+    metric: AlgoMetric = algorithm.algo.metrics.get(name='price_earnings')
+    ticker = Ticker.objects.get(symbol='1')
+    outdated = FinvizFundamental.objects.get(ticker=ticker)
+    with django_assert_num_queries(1):
+        assert metric.get_latest_instance(ticker) == outdated, 'Latest instance of ticker without summary mismatch'
+    latest = ticker.add_fundamental({'price_earnings': 100})
+    FinvizFundamental.objects.create(ticker=ticker, price_earnings=1)  # not registered by ingestion
+    with django_assert_num_queries(1):
+        assert metric.get_latest_instance(ticker) == latest, 'Latest instance is not referenced by ticker summary'
+
+
+def test_normalization_data_cache(algorithm: Algorithm, monkeypatch, django_assert_max_num_queries):
+    calls = []
+    get_normalization_data = AlgoMetric.get_normalization_data
+
+    def counted(metric: AlgoMetric):
+        calls.append(metric.id)
+        return get_normalization_data(metric)
+
+    monkeypatch.setattr(AlgoMetric, 'get_normalization_data', counted)
+    metric: AlgoMetric = algorithm.algo.metrics.get(name='price_earnings')
+    with django_assert_max_num_queries(1):  # key does not scan source data
+        algo_cache.MetricCache(metric).key
+    data = algo_cache.MetricCache(metric).normalization_data()
+    assert algo_cache.MetricCache(metric).normalization_data() == data, 'Cached data differs from calculated'
+    assert len(calls) == 1, 'Normalization data is calculated again without source changes'
+    metric.weight = 0.1  # weight tuning does not affect normalization inputs
+    metric.save()
+    algo_cache.MetricCache(metric).normalization_data()
+    assert len(calls) == 1, 'Normalization data is recalculated after weight change'
+    task = Task.objects.create(name='append_finviz_fundamental')
+    task.arguments_dict = {'ticker': '1'}
+    task.result_dict = {'values': {'price_earnings': 100}}
+    append_finviz_fundamental(task)
+    assert algo_cache.MetricCache(metric).normalization_data() != data, 'Cached data is not refreshed on new source'
+    assert len(calls) == 2, 'Normalization data is not recalculated after source ingestion'
+    algorithm.scope.tickers.remove(Ticker.objects.get(symbol='2'))
+    algo_cache.MetricCache(metric).normalization_data()
+    assert len(calls) == 3, 'Normalization data is not recalculated after scope change'
+
+
 def test_calculate_algo_metrics(
         network_client_on_dispatcher: NetworkClient,
         algorithm: Algorithm,
@@ -160,3 +252,63 @@ def test_bulk_algo_rate(
     for algo_slice in algo_slices:
         logger.info(algo_slice)
         assert float(algo_slice.ticker.symbol) / 10 == algo_slice.result, f'Actual rate differs from expected'
+
+
+def test_batch_rate_matches_per_slice(
+        network_client_on_dispatcher: NetworkClient,
+        algo_with_calculated_metrics: Algorithm,
+):
+    flow_processor = FlowProcessor()
+    algo: Algo = algo_with_calculated_metrics.algo
+    flows = []
+    for algo_slice in algo.algoslice_set.all():
+        workflow = RateAlgoSliceWorkflow()
+        flows.append(workflow.create())
+        workflow.arguments_update({'algo_slice_id': algo_slice.id})
+    start = monotonic()
+    while [flow for flow in flows if not flow.processing_state == TaskState.DONE] and monotonic() < start + 10:
+        flow_processor.processing_cycle()
+        network_client_on_dispatcher.processing_cycle()
+        [flow.refresh_from_db() for flow in flows]
+    per_slice = dict(algo.algoslice_set.values_list('id', 'result'))
+    assert None not in per_slice.values(), 'Not every slice is rated by per-slice workflow'
+    algo.algoslice_set.update(result=None)
+    assert rate_slices(algo) == len(per_slice), 'Not every slice is rated'
+    for algo_slice in algo.algoslice_set.all():
+        assert algo_slice.result == per_slice[algo_slice.id], f'Batch rate differs from per-slice one'
+    assert not rate_slices(algo), 'Rated slices are processed again'
+
+
+def run_local_flow(workflow, arguments: dict):
+    flow_processor = FlowProcessor()
+    flow = workflow.create()
+    workflow.arguments_update({**arguments, 'engine': LOCAL_ENGINE})
+    for _ in range(10):  # local engine needs no network processing
+        flow_processor.processing_cycle()
+        flow.refresh_from_db()
+        if flow.processing_state == TaskState.DONE:
+            break
+    assert flow.processing_state == TaskState.DONE, f'{workflow.flow_name} flow is not completed'
+    return flow
+
+
+def test_incremental_metrics_apply(algorithm: Algorithm):
+    algo: Algo = algorithm.algo
+    run_local_flow(CalculateAlgoMetricsWorkflow(), {'algo_name': algo.name, 'is_reference': True})
+    rate_slices(algo)
+    algo.algoslice_set.update(date=now().date() - timedelta(days=1))
+    ticker = Ticker.objects.get(symbol='1')
+    fundamental = FinvizFundamental.objects.create(ticker=ticker, price_earnings=4, price_sales=8)
+    flow = run_local_flow(ApplyAlgoMetricsWorkflow(), {'algo_name': algo.name, 'incremental': True})
+    for task in flow.task_set.all():
+        assert list(task.arguments_dict['input_data']) == [str(fundamental.id)], \
+            'Incremental input is not limited to changed tickers'
+    todays_slices = list(algo.algoslice_set.filter(date=now().date()))
+    assert [algo_slice.ticker for algo_slice in todays_slices] == [ticker], 'Unchanged tickers are processed'
+    algo_slice: AlgoSlice = todays_slices[0]
+    assert algo_slice.result == 0.2, 'Changed ticker is not re-rated'
+    assert {metric_slice.source_id for metric_slice in algo_slice.metrics} == {fundamental.id}, \
+        'Metric slices source is not updated'
+    assert algo.algoslice_set.count() == algorithm.scope.tickers.count() + 1, 'Unexpected slices are created'
+    flow = run_local_flow(ApplyAlgoMetricsWorkflow(), {'algo_name': algo.name, 'incremental': True})
+    assert not flow.task_set.exists(), 'Unchanged source data is applied again'
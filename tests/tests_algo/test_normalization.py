@@ -0,0 +1,37 @@
+import logging
+
+import pytest
+
+from algo.normalization import normalization
+from tests.tests_edge.test_normalization import NORMAL_DISTRIBUTION_DATA, UNIFORM_DISTRIBUTION_DATA
+
+logger = logging.getLogger(__name__)
+
+
+@pytest.mark.parametrize("normalization_method, data, expected", [
+        pytest.param("minmax", UNIFORM_DISTRIBUTION_DATA, {"min": 0.0, "max": 20.0}, id="minmax"),
+        pytest.param("minmax_inverted", UNIFORM_DISTRIBUTION_DATA, {"min": 0.0, "max": 20.0}, id="minmax_inverted"),
+        pytest.param("z_score", NORMAL_DISTRIBUTION_DATA, {"mean": 5.0, "std": 2.0976176963403033}, id="z_score"),
+        pytest.param("robust", UNIFORM_DISTRIBUTION_DATA, {"median": 10.0, "iqr": 10.0}, id="robust"),
+])
+def test_local_normalization_parameters(normalization_method: str, data: dict, expected: dict):
+    result = normalization(input_data=data, norm_method=normalization_method, parameters={})
+    logger.info(result)
+    assert result['parameters'] == expected, f'Normalization parameters differs from expected'
+    assert result['result'].keys() == data.keys(), f'Normalized values do not correspond to input data'
+
+
+@pytest.mark.parametrize("normalization_method, parameters, data, expected", [
+        pytest.param("minmax", {"min": 0.0, "max": 20.0}, {"SMPL": 6}, {"SMPL": 0.3}, id="minmax"),
+        pytest.param("minmax_inverted", {"min": 0.0, "max": 20.0}, {"SMPL": 6}, {"SMPL": 0.7}, id="minmax_inverted"),
+        pytest.param("z_score", {"mean": 5.0, "std": 2.0976176963403033}, {"SMPL": 4}, {"SMPL": -0.4767}, id="z_score"),
+        pytest.param("robust", {"median": 10.0, "iqr": 10.0}, {"SMPL": 6}, {"SMPL": -0.4}, id="robust"),
+])
+def test_local_apply_normalization_params(normalization_method: str, parameters: dict, data: dict, expected: dict):
+    result = normalization(input_data=data, norm_method=normalization_method, parameters=parameters, metric_id=1)
+    assert result['result'] == expected, f'Normalization result differs from expected'
+
+
+def test_local_normalization_unknown_method():
+    with pytest.raises(ValueError):
+        normalization(input_data=UNIFORM_DISTRIBUTION_DATA, norm_method='unknown')
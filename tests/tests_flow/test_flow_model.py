@@ -9,6 +9,7 @@ from django.utils.timezone import now
 from flow.lib.flow_processor import FlowProcessor
 from flow.models import Flow, FlowState
 from flow.workflow.test import TestRelayWorklow
+from lib.db import QuerySetCursor, get_created_flows, get_postponed_flows
 
 logger = logging.getLogger(__name__)
 
@@ -51,3 +52,43 @@ def test_flow_queues():
     flow.postponed = now()
     flow.save()
     validate_flow_in_queue(FlowState.POSTPONED)
+
+
+def test_query_set_cursor_pagination():
+    flows = [TestRelayWorklow().create() for _ in range(5)]
+    cursor = QuerySetCursor(get_created_flows, page_size=2)
+    assert [next(cursor) for _ in range(4)] == flows[:4], 'Cursor does not follow query set ordering'
+    flows[4].state = FlowState.RUNNING
+    flows[4].save()
+    assert next(cursor) == flows[0], 'Cursor does not start over after reaching the tail'
+    assert next(cursor) == flows[1], 'Cursor does not resume from the last yielded row'
+    Flow.objects.all().delete()
+    assert next(cursor) is None, 'Cursor yields flow from empty query set'
+
+
+def test_query_set_cursor_non_unique_key():
+    postponed = now()
+    flows = [TestRelayWorklow().create() for _ in range(3)]
+    for flow in flows:
+        flow.postponed = postponed
+        flow.save()
+    cursor = QuerySetCursor(get_postponed_flows, page_size=1)
+    assert [next(cursor) for _ in range(3)] == flows, 'Cursor skips rows sharing the same ordering key'
+
+
+def test_flow_arguments_cache(django_assert_num_queries):
+    flow = TestRelayWorklow().create()
+    flow.arguments_dict = {'ticker': 'TEST'}
+    assert flow.arguments == '{}', 'Assigned arguments are encoded before save'
+    with django_assert_num_queries(1):
+        assert flow.save_json() == ['arguments'], 'Changed arguments are not saved'
+    assert flow.arguments_dict is flow.arguments_dict, 'Arguments are decoded on every access'
+    with django_assert_num_queries(0):
+        assert flow.save_json() == [], 'Unchanged arguments are saved'
+
+    flow.arguments_dict = {'ticker': 'STALE'}
+    flow.save(update_fields=['stage'])
+    flow.refresh_from_db()
+    assert flow.arguments_dict == {'ticker': 'TEST'}, 'Arguments excluded from update fields are saved'
+    flow.arguments = '{"ticker": "RAW"}'
+    assert flow.arguments_dict == {'ticker': 'RAW'}, 'Raw arguments assignment is not reflected'
@@ -8,6 +8,7 @@ import pytest
 from django.utils.timezone import now
 
 from flow.lib.flow_processor import FlowProcessor
+from lib.db import release_waiting_flows
 from flow.models import FlowState
 from flow.workflow import (
     TestRelayWorklow,
@@ -15,7 +16,8 @@ from flow.workflow import (
     TestTaskPostProcPositiveWorkflow,
     TestTaskPostProcNegativeWorkflow,
 )
-from task.models import Task
+from task.lib.constants import FLOW_PROCESSING_QUOTAS, IDLE_SLEEP_MIN_TIMEOUT, IDLE_SLEEP_TIMEOUT
+from task.models import Task, TaskState
 
 logger = logging.getLogger(__name__)
 
@@ -123,3 +125,63 @@ def test_flow_finalization():
     flow_processor.generic_stage_handler(flow_processor.cleanup_done, FlowState.DONE)
     assert not next(flow_processor.queues[FlowState.DONE]), \
         'Unexpected flow is received from completed queue'
+
+
+def test_waiting_flow_release():
+    flow_processor = FlowProcessor()
+    flow = TestTaskPostProcPositiveWorkflow().create()
+    flow_processor.generic_stage_handler(flow_processor.start_flow, FlowState.CREATED)
+    flow.refresh_from_db()
+    workflow = TestTaskPostProcPositiveWorkflow(flow)
+    assert not workflow.check_all_task_processed(), 'Flow tasks are processed when not expected'
+    flow.refresh_from_db()
+    assert flow.waiting, 'Flow is not marked as waiting for tasks'
+    assert not next(flow_processor.queues[FlowState.RUNNING]), 'Waiting flow is received from running queue'
+
+    assert release_waiting_flows([flow.id]) == 0, 'Flow with outstanding tasks is released'
+    flow.task_set.update(processing_state=TaskState.PROCESSED)
+    assert release_waiting_flows([flow.id]) == 1, 'Flow is not released after tasks are processed'
+    flow.refresh_from_db()
+    assert not flow.waiting, 'Released flow is still marked as waiting'
+    assert flow == next(flow_processor.queues[FlowState.RUNNING]), 'Released flow is missing in running queue'
+    assert workflow.check_all_task_processed(), 'Flow tasks are not processed when expected'
+
+
+def test_adaptive_quota():
+    base_quota = FLOW_PROCESSING_QUOTAS[FlowState.CREATED]
+    flows = [TestStagesWorklow().create() for _ in range(base_quota * 3)]
+    flow_processor = FlowProcessor()
+    flow_processor.generic_stage_handler(flow_processor.start_flow, FlowState.CREATED)
+    stats = flow_processor.stage_stats[FlowState.CREATED]
+    assert stats['backlog'], f'Backlog is not detected: {stats}'
+    assert flow_processor.quotas[FlowState.CREATED] == base_quota * 2, 'Quota is not increased on backlog'
+    flow_processor.generic_stage_handler(flow_processor.start_flow, FlowState.CREATED)
+    for flow in flows:
+        flow.refresh_from_db()
+        assert flow.processing_state == FlowState.RUNNING, f'Flow {flow.id} is not started within increased quota'
+    stats = flow_processor.stage_stats[FlowState.CREATED]
+    assert stats['taken'] == base_quota * 2 and not stats['backlog'], \
+        f'Backlog is reported for queue drained by exactly quota items: {stats}'
+    assert flow_processor.quotas[FlowState.CREATED] == base_quota * 2, 'Quota is increased without backlog'
+    flow_processor.generic_stage_handler(flow_processor.start_flow, FlowState.CREATED)
+    stats = flow_processor.stage_stats[FlowState.CREATED]
+    assert not stats['backlog'] and not stats['taken'], f'Unexpected stats for empty queue: {stats}'
+    assert flow_processor.quotas[FlowState.CREATED] == base_quota, 'Quota is not decreased for empty queue'
+
+
+def test_idle_backoff():
+    flow_processor = FlowProcessor()
+    flow_processor.sleep = lambda timeout: None
+    timeouts = []
+    for _ in range(10):
+        flow_processor.init_cycle()
+        timeouts.append(flow_processor.idle_timeout)
+        flow_processor.finalize_cycle()
+    assert timeouts[0] == IDLE_SLEEP_MIN_TIMEOUT, 'First idle cycle sleep differs from minimal one'
+    assert timeouts == sorted(timeouts), f'Idle sleep is not increasing: {timeouts}'
+    assert timeouts[-1] == IDLE_SLEEP_TIMEOUT, f'Idle sleep exceeds limit: {timeouts}'
+    TestStagesWorklow().create()
+    flow_processor.init_cycle()
+    flow_processor.processing_cycle()
+    flow_processor.finalize_cycle()
+    assert flow_processor.idle_timeout == IDLE_SLEEP_MIN_TIMEOUT, 'Idle sleep is not reset after active cycle'
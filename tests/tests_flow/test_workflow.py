@@ -0,0 +1,123 @@
+import logging
+
+from datetime import datetime, time
+
+import pytest
+
+from flow.models import Flow
+from flow.workflow import (
+    AddAllTickerPricesWorkflow,
+    AppendTickerPricesBatchWorkflow,
+    AppendTickerPricesWorfklow,
+    TestNestedStagesWorkflow,
+    TestStagesWorklow,
+    get_workflow_map,
+)
+from flow.workflow.generic import TaskHandler, Workflow
+from lib.trading_calendar import last_trading_day, previous_trading_day
+from ticker.models import Ticker
+
+logger = logging.getLogger(__name__)
+
+pytestmark = pytest.mark.django_db
+
+
+def test_global_price_collection_skips_current_tickers():
+    session = last_trading_day()
+    current = Ticker.objects.create(symbol='CURR')
+    current.add_prices([[datetime.combine(session, time()).isoformat(), 1, 1, 1, 1, 1]])
+    outdated = Ticker.objects.create(symbol='OUTD')
+    outdated.add_prices([[datetime.combine(previous_trading_day(session), time()).isoformat(), 1, 1, 1, 1, 1]])
+    Ticker.objects.create(symbol='NEW')
+    workflow = AddAllTickerPricesWorkflow()
+    workflow.create()
+    assert workflow.stage_0(), 'Global price collection stage failed'
+    symbols = sorted(flow.arguments_dict['ticker'] for flow in workflow.child_flows)
+    assert symbols == ['NEW', 'OUTD'], 'Collection is not limited to outdated tickers'
+
+
+def test_global_price_collection_batches():
+    session = last_trading_day()
+    current = Ticker.objects.create(symbol='CURR')
+    current.add_prices([[datetime.combine(session, time()).isoformat(), 1, 1, 1, 1, 1]])
+    for symbol in ('NEW1', 'NEW2', 'NEW3'):
+        Ticker.objects.create(symbol=symbol)
+    workflow = AddAllTickerPricesWorkflow()
+    workflow.create()
+    workflow.arguments_update({'batch_size': 2})
+    assert workflow.stage_0(), 'Global price collection stage failed'
+    child_flows = list(workflow.child_flows)
+    assert {flow.name for flow in child_flows} == {AppendTickerPricesBatchWorkflow.flow_name}, \
+        'Batch collection workflow is not used'
+    batches = sorted(sorted(flow.arguments_dict['tickers']) for flow in child_flows)
+    assert batches == [['NEW1', 'NEW2'], ['NEW3']], 'Tickers are not split into batches'
+    batch_workflow = AppendTickerPricesBatchWorkflow(child_flows[0])
+    assert batch_workflow.stage_0(), 'Batch prices collection stage failed'
+    task = batch_workflow.flow.task_set.get()
+    assert task.function == 'ticker_history_batch', 'Batch collection task function mismatch'
+    assert [item['ticker'] for item in task.arguments_dict['tickers']] == child_flows[0].arguments_dict['tickers']
+
+
+def test_bulk_child_flow_creation(django_assert_max_num_queries):
+    workflow = AddAllTickerPricesWorkflow()
+    parent = workflow.create()
+    arguments = [{'ticker': f'T{idx}'} for idx in range(1600)]
+    with django_assert_max_num_queries(len(arguments) // 50):  # SQLite limits rows per insert statement
+        assert workflow.create_child_flows(AppendTickerPricesWorfklow, arguments) == len(arguments)
+    assert workflow.child_flows.count() == len(arguments), 'Child flows are not linked to parent flow'
+    assert [flow.arguments_dict for flow in workflow.child_flows.order_by('id')] == arguments, \
+        'Child flow arguments mismatch'
+    assert not workflow.check_child_flows_done(), 'Child flows are reported done after creation'
+    parent.delete()
+    assert not Flow.objects.exists(), 'Child flows are not deleted with parent flow'
+
+
+def test_child_flows_completion_check(django_assert_num_queries):
+    workflow = AddAllTickerPricesWorkflow()
+    workflow.create()
+    workflow.create_child_flows(AppendTickerPricesWorfklow, [{'ticker': f'T{idx}'} for idx in range(100)])
+    children = list(workflow.child_flows)
+    for flow in children[:-1]:
+        flow.set_done()
+    with django_assert_num_queries(1):
+        assert not workflow.check_child_flows_done(), 'Parent flow is done with running child flow'
+    children[-1].set_done()
+    children[0].delete()  # done child flows may be cleaned up before parent flow
+    with django_assert_num_queries(1):
+        assert workflow.check_child_flows_done(), 'Parent flow is not done with all child flows done'
+
+
+def test_workflow_stage_table():
+    workflow_map = get_workflow_map()
+    assert workflow_map['generic'] is Workflow, 'Generic workflow is missing in workflow map'
+    assert workflow_map['test_nested_stages'] is TestNestedStagesWorkflow, 'Nested workflow is not registered'
+    assert workflow_map['test_stages'] is TestStagesWorklow, 'Nested workflow overrides parent registration'
+    assert TestStagesWorklow.stages == tuple(f'stage_{idx}' for idx in range(5)), 'Stage table mismatch'
+    assert TestNestedStagesWorkflow.stage_count == 6, 'Nested workflow stage count mismatch'
+
+    class UnnamedWorkflow(TestStagesWorklow, TaskHandler):
+        pass
+
+    assert get_workflow_map()['test_stages'] is TestStagesWorklow, 'Workflow without own flow name is registered'
+    flow = TestNestedStagesWorkflow().create()
+    flow.stage = 5
+    workflow = TestNestedStagesWorkflow(flow)
+    assert workflow.get_active_stage_method() == workflow.stage_5, 'Active stage method mismatch'
+    assert workflow.check_last_stage(), 'Last stage is not detected'
+    flow.stage = 6
+    with pytest.raises(AttributeError):
+        workflow.get_active_stage_method()
+
+
+def test_batch_price_collection_start_dates(django_assert_max_num_queries):
+    symbols = [f'BATCH{idx}' for idx in range(5)]
+    for symbol in symbols:
+        Ticker.objects.create(symbol=symbol).add_prices([['2022-06-28T00:00:00', 1, 1, 1, 1, 1]])
+    workflow = AppendTickerPricesBatchWorkflow()
+    workflow.create()
+    workflow.arguments = {'tickers': symbols}
+    with django_assert_max_num_queries(4):  # summaries of the whole batch are loaded at once
+        assert workflow.stage_0(), 'Batch prices collection stage failed'
+    task = workflow.flow.task_set.get()
+    assert {item['start'] for item in task.arguments_dict['tickers']} == {'2022-6-29'}, \
+        'Batch start dates do not follow latest price dates'
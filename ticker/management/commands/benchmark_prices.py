@@ -0,0 +1,71 @@
+import logging
+
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from lib.benchmark import format_measurement, measure
+from ticker import partitioning
+from ticker.models import BULK_INSERT_BATCH_SIZE, Price, Ticker
+
+logger = logging.getLogger(__name__)
+
+BENCHMARK_TICKER_PREFIX = 'BM'
+
+
+class Command(BaseCommand):
+    help = 'Measure latest price date lookup and 1 year range scan latency against synthetic price history. ' \
+           'Run before and after partition_timeseries to compare table layouts. All generated rows are rolled back.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000000, help='Price rows to generate')
+        parser.add_argument('--tickers', type=int, default=1600, help='Synthetic ticker count')
+        parser.add_argument('--repeat', type=int, default=20, help='Measurements per query')
+        parser.add_argument('--explain', action='store_true', help='Print query plans')
+
+    def handle(self, *args, **options):
+        layout = 'partitioned' if partitioning.is_supported() and partitioning.is_partitioned(Price) else 'plain'
+        with transaction.atomic():
+            tickers = self.populate(options['rows'], options['tickers'])
+            self.stdout.write(f'Price table rows: {Price.objects.count()}, layout: {layout}')
+            ticker = tickers[len(tickers) // 2]
+            end = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+            start = end - timedelta(days=365)
+            legacy_lookup = ticker.price_set.order_by('date')
+            queries = (
+                ('latest date (count + latest)', lambda: legacy_lookup.count() and legacy_lookup.latest('date').date),
+                ('latest date (windowed)', ticker.latest_price_date),
+                ('1 year range scan', lambda: list(ticker.prices_between(start, end).values_list('date', 'close'))),
+            )
+            for label, query in queries:
+                self.stdout.write(format_measurement(label, measure(query, options['repeat'])))
+            if options['explain']:
+                self.stdout.write(ticker.prices_between(start, end).explain())
+            transaction.set_rollback(True)
+
+    def populate(self, row_count: int, ticker_count: int):
+        Ticker.objects.bulk_create([Ticker(symbol=f'{BENCHMARK_TICKER_PREFIX}{idx}') for idx in range(ticker_count)],
+                                   batch_size=BULK_INSERT_BATCH_SIZE)
+        tickers = list(Ticker.objects.filter(symbol__startswith=BENCHMARK_TICKER_PREFIX).order_by('id'))
+        days = max(row_count // len(tickers), 1)
+        first_day = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days)
+        if connection.vendor == 'postgresql':
+            # Server side generation is orders of magnitude faster than ORM batches for 10M rows
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'INSERT INTO ticker_price (ticker_id, date, open, high, low, close, volume) '
+                    'SELECT ticker.id, %s + day * INTERVAL \'1 day\', 1, 1, 1, 1, 1 '
+                    'FROM ticker_ticker ticker CROSS JOIN generate_series(1, %s) day '
+                    'WHERE ticker.id BETWEEN %s AND %s',
+                    [first_day, days, tickers[0].id, tickers[-1].id]
+                )
+        else:
+            for ticker in tickers:
+                Price.objects.bulk_create(
+                    [Price(ticker=ticker, date=first_day + timedelta(days=day), open=1, high=1, low=1, close=1,
+                           volume=1) for day in range(1, days + 1)],
+                    batch_size=BULK_INSERT_BATCH_SIZE
+                )
+        logger.info(f'{days * len(tickers)} price rows generated')
+        return tickers
@@ -0,0 +1,39 @@
+import logging
+
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ticker import partitioning
+from ticker.models import Dividend, Price
+
+logger = logging.getLogger(__name__)
+
+TIMESERIES_MODELS = (Price, Dividend)
+
+
+class Command(BaseCommand):
+    help = 'Partition price and dividend tables by year (PostgreSQL) and create partitions for upcoming years. ' \
+           'Dates without yearly partition are stored in default partition and moved on rerun, ' \
+           'e.g. on schedule before a new year starts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=1, help='Upcoming years to create partitions for')
+        parser.add_argument('--first-year', type=int, default=None,
+                            help='First yearly partition on table conversion, earlier dates go to history partition. '
+                                 'Defaults to the earliest stored date year')
+
+    def handle(self, *args, **options):
+        if not partitioning.is_supported():
+            raise CommandError('Table partitioning requires PostgreSQL database')
+        current_year = datetime.now().year
+        last_year = current_year + options['ahead']
+        for model in TIMESERIES_MODELS:
+            table = model._meta.db_table
+            if partitioning.is_partitioned(model):
+                created = partitioning.create_partitions(model, current_year, last_year)
+                self.stdout.write(f'{table}: {len(created)} partition(s) created')
+                continue
+            first_year = options['first_year'] or partitioning.get_data_first_year(model, current_year)
+            partitioning.convert_to_partitioned(model, first_year, last_year)
+            self.stdout.write(f'{table}: converted to yearly partitions {first_year}-{last_year}')
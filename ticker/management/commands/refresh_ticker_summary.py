@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ticker.models import Ticker, TickerSummary
+
+
+class Command(BaseCommand):
+    help = 'Recalculate ticker data freshness summaries from price, dividend and fundamental tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('symbols', nargs='*', help='Ticker symbols to refresh, all tickers if omitted')
+
+    def handle(self, *args, **options):
+        ticker_ids = None
+        if options['symbols']:
+            ticker_ids = list(Ticker.objects.filter(symbol__in=options['symbols']).values_list('id', flat=True))
+        with transaction.atomic():
+            summaries = TickerSummary.refresh(ticker_ids)
+        self.stdout.write(f'{len(summaries)} ticker summary(ies) refreshed')
@@ -0,0 +1,26 @@
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ticker import price_store
+from ticker.models import Ticker
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Rebuild memory-mapped price store files from database price history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('symbols', nargs='*', help='Ticker symbols to sync, all tickers if omitted')
+
+    def handle(self, *args, **options):
+        if not price_store.is_enabled():
+            raise CommandError('Price store is disabled, PRICE_STORE_ROOT is not set')
+        tickers = Ticker.objects.all()
+        if options['symbols']:
+            tickers = tickers.filter(symbol__in=options['symbols'])
+        for ticker in tickers.only('id', 'symbol').iterator():
+            price_store.sync(ticker.id)
+            logger.debug(f'{ticker} price store is synced')
+        self.stdout.write(f'Price store is synced for {tickers.count()} ticker(s) in {price_store.get_root()}')
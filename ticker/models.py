@@ -1,4 +1,21 @@
-from django.db import models
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Union
+
+import numpy as np
+
+from django.db import models, transaction
+
+from ticker import price_store
+
+BULK_INSERT_BATCH_SIZE = 1000
+# Latest date lookup is bounded by these windows first, so only recent partitions are scanned
+LATEST_DATE_LOOKUP_WINDOWS = (timedelta(days=31), timedelta(days=366))
+
+
+def to_datetime(date: Union[str, datetime]) -> datetime:
+    if isinstance(date, datetime):
+        return date
+    return datetime.fromisoformat(str(date))
 
 
 class AbstractTicker(models.Model):
@@ -18,28 +35,99 @@ class Ticker(AbstractTicker):
     def get_price_by_date(self, date: str):
         return self.price_set.filter(date=date)
 
+    @staticmethod
+    def _latest_date(query_set: models.QuerySet) -> Optional[datetime]:
+        for window in LATEST_DATE_LOOKUP_WINDOWS:
+            latest = query_set.filter(date__gte=datetime.now() - window).aggregate(latest=models.Max('date'))['latest']
+            if latest:
+                return latest
+        return query_set.aggregate(latest=models.Max('date'))['latest']
+
+    @property
+    def summary_or_none(self) -> Optional['TickerSummary']:
+        # Related object cache is replaced by ingestion (see TickerSummary.get_for_update) and refresh_from_db
+        try:
+            return self.summary
+        except TickerSummary.DoesNotExist:
+            return None
+
+    def latest_price_date(self) -> Optional[datetime]:
+        summary = self.summary_or_none
+        return summary.latest_price_date if summary else self._latest_date(self.price_set)
+
+    def prices_between(self, start: datetime, end: datetime) -> models.QuerySet:
+        """
+        Returns prices in [start, end) date range ordered by date.
+        """
+        return self.price_set.filter(date__gte=start, date__lt=end).order_by('date')
+
     def add_price(self, price_data_list: list) -> bool:
-        date, _open, high, low, close, volume = price_data_list
-        if self.get_price_by_date(date=date):
-            # TODO: Generate corresponding schedule
-            # logger.debug(f'{ticker_name} price for {date} already exists')
-            return False
-        else:
-            Price.objects.create(ticker=self, date=date, open=_open, high=high, low=low, close=close, volume=volume)
-            return True
+        return bool(self.add_prices([price_data_list]))
+
+    def add_prices(self, price_data_lists: Iterable[list]) -> int:
+        """
+        Appends price rows in one batched insert. Rows with dates already stored for the ticker
+        (or repeated within the input) are skipped. Returns the count of inserted rows.
+        """
+        prices = []
+        for date, _open, high, low, close, volume in price_data_lists:
+            prices.append(Price(ticker=self, date=to_datetime(date), open=_open, high=high, low=low, close=close,
+                                volume=volume))
+        with transaction.atomic():
+            summary = TickerSummary.get_for_update(self)  # also serializes concurrent ticker writers
+            inserted = self._bulk_add_by_date(Price, prices)
+            if inserted:
+                summary.register_prices(inserted)
+        if inserted:
+            # Store must not see rows of an enclosing transaction that may still roll back
+            transaction.on_commit(lambda: price_store.sync(self.id))
+        return len(inserted)
+
+    def price_history(self) -> Dict[str, np.ndarray]:
+        """
+        Returns price history as date and OHLCV arrays ordered by date.
+        Arrays are memory-mapped from the price store when it is enabled.
+        """
+        return price_store.load(self.id)
+
+    def _bulk_add_by_date(self, model_class, objects: List[models.Model]) -> List[models.Model]:
+        dates = {obj.date for obj in objects}
+        existing = set(model_class.objects.filter(ticker=self, date__in=dates).values_list('date', flat=True))
+        new_objects = []
+        for obj in objects:
+            if obj.date in existing:
+                continue
+            existing.add(obj.date)
+            new_objects.append(obj)
+        # Conflicts are still possible with a concurrent writer; unique (ticker, date) constraint drops them.
+        model_class.objects.bulk_create(new_objects, batch_size=BULK_INSERT_BATCH_SIZE, ignore_conflicts=True)
+        return new_objects
 
     def get_dividend_by_date(self, date: str):
         return self.dividend_set.filter(date=date)
 
+    def latest_dividend_date(self) -> Optional[datetime]:
+        summary = self.summary_or_none
+        return summary.latest_dividend_date if summary else self._latest_date(self.dividend_set)
+
     def add_dividend(self, dividend_data_list: list) -> bool:
-        date, size = dividend_data_list
-        if self.get_dividend_by_date(date=date):
-            # TODO: Generate corresponding schedule
-            # logger.debug(f'{ticker_name} dividend for {date} already exists')
-            return False
-        else:
-            Dividend.objects.create(ticker=self, date=date, size=size)
-            return True
+        return bool(self.add_dividends([dividend_data_list]))
+
+    def add_dividends(self, dividend_data_lists: Iterable[list]) -> int:
+        dividends = [Dividend(ticker=self, date=to_datetime(date), size=size) for date, size in dividend_data_lists]
+        with transaction.atomic():
+            summary = TickerSummary.get_for_update(self)
+            inserted = self._bulk_add_by_date(Dividend, dividends)
+            if inserted:
+                summary.register_dividends(inserted)
+        return len(inserted)
+
+    def add_fundamental(self, values: Dict) -> 'FinvizFundamental':
+        with transaction.atomic():
+            summary = TickerSummary.get_for_update(self)
+            fundamental = FinvizFundamental.objects.create(ticker=self, **values)
+            summary.register_fundamental(fundamental)
+        return fundamental
 
 
 class Scope(models.Model):
@@ -61,6 +149,11 @@ class Price(models.Model):
     close = models.FloatField(null=True)
     volume = models.FloatField(null=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['ticker', 'date'], name='unique_price_ticker_date'),
+        ]
+
 
 class Dividend(models.Model):
     id = models.AutoField(primary_key=True, help_text='Internal ID')
@@ -68,6 +161,11 @@ class Dividend(models.Model):
     date = models.DateTimeField()
     size = models.FloatField()
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['ticker', 'date'], name='unique_dividend_ticker_date'),
+        ]
+
 
 class FinvizFundamental(models.Model):
     id = models.AutoField(primary_key=True, help_text='Internal ID')
@@ -118,3 +216,116 @@ class FinvizFundamental(models.Model):
     sma20 = models.FloatField(null=True, help_text='Distance from 20-Day Simple Moving Average')
     sma50 = models.FloatField(null=True, help_text='Distance from 50-Day Simple Moving Average')
     sma200 = models.FloatField(null=True, help_text='Distance from 200-Day Simple Moving Average')
+
+
+class TickerSummary(models.Model):
+    """
+    Per ticker data freshness summary maintained by ingestion (Ticker.add_prices, add_dividends, add_fundamental),
+    so latest data lookups do not aggregate time series tables.
+    """
+    ticker = models.OneToOneField(Ticker, primary_key=True, on_delete=models.CASCADE, related_name='summary')
+    price_count = models.IntegerField(default=0)
+    latest_price_id = models.IntegerField(null=True)
+    latest_price_date = models.DateTimeField(null=True)
+    latest_close = models.FloatField(null=True)
+    dividend_count = models.IntegerField(default=0)
+    latest_dividend_id = models.IntegerField(null=True)
+    latest_dividend_date = models.DateTimeField(null=True)
+    fundamental_count = models.IntegerField(default=0)
+    latest_fundamental_id = models.IntegerField(null=True)
+    latest_fundamental_date = models.DateTimeField(null=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def get_for_update(cls, ticker: Ticker) -> 'TickerSummary':
+        """
+        Returns locked ticker summary, should be called within transaction.
+        """
+        summary, created = cls.objects.select_for_update().get_or_create(ticker=ticker)
+        if created:  # Summary of previously ingested data is restored
+            summary = cls.refresh([ticker.id])[0]
+        ticker.summary = summary
+        return summary
+
+    def register_prices(self, prices: List[Price]):
+        latest = max(prices, key=lambda price: price.date)
+        self.price_count += len(prices)
+        if not self.latest_price_date or latest.date >= self.latest_price_date:
+            # Bulk inserted rows have no primary keys on every backend
+            self.latest_price_id = Price.objects.filter(ticker_id=self.ticker_id, date=latest.date) \
+                .values_list('id', flat=True).first()
+            self.latest_price_date = latest.date
+            self.latest_close = latest.close
+        self.save()
+
+    def register_dividends(self, dividends: List[Dividend]):
+        latest = max(dividends, key=lambda dividend: dividend.date)
+        self.dividend_count += len(dividends)
+        if not self.latest_dividend_date or latest.date >= self.latest_dividend_date:
+            self.latest_dividend_id = Dividend.objects.filter(ticker_id=self.ticker_id, date=latest.date) \
+                .values_list('id', flat=True).first()
+            self.latest_dividend_date = latest.date
+        self.save()
+
+    def register_fundamental(self, fundamental: FinvizFundamental):
+        self.fundamental_count += 1
+        self.latest_fundamental_id = fundamental.id
+        self.latest_fundamental_date = fundamental.date
+        self.save()
+
+    @classmethod
+    def refresh(cls, ticker_ids: Iterable[int] = None) -> List['TickerSummary']:
+        """
+        Recalculates summaries from time series tables. Every ticker is refreshed if ticker ids are not provided.
+        """
+        tickers = Ticker.objects.all() if ticker_ids is None else Ticker.objects.filter(id__in=ticker_ids)
+        latest_price = Price.objects.filter(ticker=models.OuterRef('pk')).order_by('-date')
+        latest_dividend = Dividend.objects.filter(ticker=models.OuterRef('pk')).order_by('-date')
+        latest_fundamental = FinvizFundamental.objects.filter(ticker=models.OuterRef('pk')).order_by('-id')
+        tickers = tickers.annotate(
+            price_count=models.Subquery(
+                Price.objects.filter(ticker=models.OuterRef('pk')).values('ticker')
+                .annotate(count=models.Count('id')).values('count')
+            ),
+            latest_price_id=models.Subquery(latest_price.values('id')[:1]),
+            latest_price_date=models.Subquery(latest_price.values('date')[:1]),
+            latest_close=models.Subquery(latest_price.values('close')[:1]),
+            dividend_count=models.Subquery(
+                Dividend.objects.filter(ticker=models.OuterRef('pk')).values('ticker')
+                .annotate(count=models.Count('id')).values('count')
+            ),
+            latest_dividend_id=models.Subquery(latest_dividend.values('id')[:1]),
+            latest_dividend_date=models.Subquery(latest_dividend.values('date')[:1]),
+            fundamental_count=models.Subquery(
+                FinvizFundamental.objects.filter(ticker=models.OuterRef('pk')).values('ticker')
+                .annotate(count=models.Count('id')).values('count')
+            ),
+            latest_fundamental_id=models.Subquery(latest_fundamental.values('id')[:1]),
+            latest_fundamental_date=models.Subquery(latest_fundamental.values('date')[:1]),
+        )
+        fields = [field.name for field in cls._meta.fields if field.name not in ('ticker', 'updated')]
+        summaries = []
+        for ticker in tickers:
+            values = {field: getattr(ticker, field) for field in fields}
+            for counter in ('price_count', 'dividend_count', 'fundamental_count'):
+                values[counter] = values[counter] or 0
+            summary, _ = cls.objects.update_or_create(ticker=ticker, defaults=values)
+            summaries.append(summary)
+        return summaries
+
+    @staticmethod
+    def tickers_without_prices_since(date: datetime) -> models.QuerySet:
+        """
+        Returns tickers that have no prices at or after provided date.
+        """
+        return Ticker.objects.exclude(summary__latest_price_date__gte=date)
+
+    @staticmethod
+    def tickers_without_fundamental_since(date: datetime) -> models.QuerySet:
+        """
+        Returns tickers that have no fundamental data collected at or after provided date.
+        """
+        return Ticker.objects.exclude(summary__latest_fundamental_date__gte=date)
+
+    def __str__(self):
+        return f'{self.ticker_id}: {self.price_count} price(s) till {self.latest_price_date}'
@@ -0,0 +1,121 @@
+import logging
+
+from datetime import date
+from typing import List, Type
+
+from django.db import connection, models, transaction
+
+logger = logging.getLogger(__name__)
+
+PARTITION_KEY = 'date'
+HISTORY_PARTITION = 'history'  # catches every date before the first yearly partition
+DEFAULT_PARTITION = 'default'  # catches dates beyond created yearly partitions until they are created
+
+
+def is_supported() -> bool:
+    return connection.vendor == 'postgresql'
+
+
+def is_partitioned(model: Type[models.Model]) -> bool:
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT relkind FROM pg_class WHERE relname = %s AND pg_table_is_visible(oid)',
+                       [model._meta.db_table])
+        row = cursor.fetchone()
+    return bool(row) and row[0] == 'p'
+
+
+def partition_name(model: Type[models.Model], year: int) -> str:
+    return f'{model._meta.db_table}_y{year}'
+
+
+def existing_partitions(model: Type[models.Model]) -> List[str]:
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT child.relname FROM pg_inherits '
+                       'JOIN pg_class parent ON parent.oid = pg_inherits.inhparent '
+                       'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+                       'WHERE parent.relname = %s', [model._meta.db_table])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def create_partitions(model: Type[models.Model], first_year: int, last_year: int) -> List[str]:
+    """
+    Creates missing yearly range partitions [first_year, last_year], the history partition
+    for dates before first_year and the default partition, so inserts never fail for dates
+    without yearly partition. Rows of new yearly range stored in default partition are moved
+    to the created partition. Returns names of created partitions.
+    """
+    table = model._meta.db_table
+    default = f'{table}_{DEFAULT_PARTITION}'
+    qn = connection.ops.quote_name
+    existing = set(existing_partitions(model))
+    created = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        history = f'{table}_{HISTORY_PARTITION}'
+        if history not in existing:
+            cursor.execute(f'CREATE TABLE {qn(history)} PARTITION OF {qn(table)} '
+                           f'FOR VALUES FROM (MINVALUE) TO (%s)', [date(first_year, 1, 1)])
+            created.append(history)
+        for year in range(first_year, last_year + 1):
+            name = partition_name(model, year)
+            if name in existing:
+                continue
+            bounds = [date(year, 1, 1), date(year + 1, 1, 1)]
+            if default in existing:
+                # Default partition must not keep rows of the new range when it is attached
+                cursor.execute(f'CREATE TABLE {qn(name)} (LIKE {qn(table)} INCLUDING DEFAULTS)')
+                cursor.execute(f'WITH moved AS (DELETE FROM {qn(default)} WHERE {qn(PARTITION_KEY)} >= %s '
+                               f'AND {qn(PARTITION_KEY)} < %s RETURNING *) INSERT INTO {qn(name)} SELECT * FROM moved',
+                               bounds)
+                cursor.execute(f'ALTER TABLE {qn(table)} ATTACH PARTITION {qn(name)} FOR VALUES FROM (%s) TO (%s)',
+                               bounds)
+            else:
+                cursor.execute(f'CREATE TABLE {qn(name)} PARTITION OF {qn(table)} FOR VALUES FROM (%s) TO (%s)',
+                               bounds)
+            created.append(name)
+        if default not in existing:
+            cursor.execute(f'CREATE TABLE {qn(default)} PARTITION OF {qn(table)} DEFAULT')
+            created.append(default)
+    for name in created:
+        logger.info(f'Partition {name} is created')
+    return created
+
+
+def convert_to_partitioned(model: Type[models.Model], first_year: int, last_year: int):
+    """
+    Moves plain model table into table partitioned by year of PARTITION_KEY.
+    Primary key becomes (id, date) since Postgres requires partition key in unique constraints,
+    identity column is replaced with a sequence as identity is not supported on partitioned tables.
+    """
+    table = model._meta.db_table
+    legacy = f'{table}_legacy'
+    sequence = f'{table}_partitioned_id_seq'  # legacy identity sequence is dropped with legacy table
+    qn = connection.ops.quote_name
+    ticker_field = model._meta.get_field('ticker')
+    ticker_table = ticker_field.related_model._meta.db_table
+    unique_constraints = [constraint for constraint in model._meta.constraints
+                          if isinstance(constraint, models.UniqueConstraint)]
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {qn(table)} IN ACCESS EXCLUSIVE MODE')
+        cursor.execute(f'ALTER TABLE {qn(table)} RENAME TO {qn(legacy)}')
+        cursor.execute(f'CREATE TABLE {qn(table)} (LIKE {qn(legacy)} INCLUDING DEFAULTS) '
+                       f'PARTITION BY RANGE ({qn(PARTITION_KEY)})')
+        cursor.execute(f'CREATE SEQUENCE IF NOT EXISTS {qn(sequence)} OWNED BY {qn(table)}.id')
+        cursor.execute(f'ALTER TABLE {qn(table)} ALTER COLUMN id SET DEFAULT nextval(%s)', [sequence])
+        create_partitions(model, first_year, last_year)
+        cursor.execute(f'INSERT INTO {qn(table)} SELECT * FROM {qn(legacy)}')
+        cursor.execute(f'SELECT setval(%s, COALESCE((SELECT MAX(id) FROM {qn(table)}), 0) + 1, false)',
+                       [sequence])
+        cursor.execute(f'DROP TABLE {qn(legacy)}')
+        cursor.execute(f'ALTER TABLE {qn(table)} ADD PRIMARY KEY (id, {qn(PARTITION_KEY)})')
+        for constraint in unique_constraints:
+            columns = ', '.join(qn(model._meta.get_field(field).column) for field in constraint.fields)
+            cursor.execute(f'ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(constraint.name)} UNIQUE ({columns})')
+        cursor.execute(f'ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(f"{table}_ticker_fk")} '
+                       f'FOREIGN KEY ({qn(ticker_field.column)}) REFERENCES {qn(ticker_table)} (id) '
+                       f'DEFERRABLE INITIALLY DEFERRED')
+    logger.info(f'{table} table is partitioned by {PARTITION_KEY} year')
+
+
+def get_data_first_year(model: Type[models.Model], default: int) -> int:
+    first_date = model.objects.aggregate(first=models.Min(PARTITION_KEY))['first']
+    return first_date.year if first_date else default
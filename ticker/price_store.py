@@ -0,0 +1,84 @@
+import logging
+import os
+
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from typing import Dict, Optional
+
+import numpy as np
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ('date', 'open', 'high', 'low', 'close', 'volume')
+PRICE_COLUMNS = COLUMNS[1:]
+DATE_UNIT = 'datetime64[s]'
+
+
+def get_root() -> Optional[Path]:
+    """
+    Price store is optional and enabled by PRICE_STORE_ROOT setting (environment variable).
+    """
+    root = getattr(settings, 'PRICE_STORE_ROOT', '')
+    return Path(root) if root else None
+
+
+def is_enabled() -> bool:
+    return get_root() is not None
+
+
+def get_path(ticker_id: int) -> Path:
+    return get_root() / f'{ticker_id}.npy'
+
+
+def to_history(data: np.ndarray) -> Dict[str, np.ndarray]:
+    history = {column: data[idx] for idx, column in enumerate(COLUMNS)}
+    history['date'] = history['date'].astype(np.int64).astype(DATE_UNIT)
+    return history
+
+
+def query_history(ticker_id: int) -> np.ndarray:
+    """
+    Loads ticker price history from database as (column, day) matrix without model instances creation.
+    Dates are stored as POSIX seconds, empty prices as NaN.
+    """
+    from ticker.models import Price
+
+    rows = Price.objects.filter(ticker_id=ticker_id).order_by('date').values_list(*COLUMNS)
+    data = np.empty((len(COLUMNS), len(rows)), dtype=np.float64)
+    if len(rows):
+        dates, *prices = zip(*rows)
+        data[0] = np.array(dates, dtype=DATE_UNIT).astype(np.int64)
+        data[1:] = np.array(prices, dtype=np.float64)  # None values are converted to NaN
+    return data
+
+
+def sync(ticker_id: int) -> bool:
+    """
+    Rewrites price store file of the ticker from database. File is replaced atomically,
+    so concurrent memory-mapped readers keep consistent data.
+    """
+    if not is_enabled():
+        return False
+    path = get_path(ticker_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = query_history(ticker_id)  # every column is a contiguous row of the matrix
+    with NamedTemporaryFile(dir=path.parent, suffix='.tmp', delete=False) as fh:
+        np.save(fh, data)
+    os.replace(fh.name, path)
+    logger.debug(f'Price store is synced for ticker {ticker_id}: {data.shape[1]} day(s)')
+    return True
+
+
+def load(ticker_id: int) -> Dict[str, np.ndarray]:
+    """
+    Returns price history columns of the ticker. Store file is memory-mapped and created on first access.
+    Database is queried directly when the store is disabled.
+    """
+    if not is_enabled():
+        return to_history(query_history(ticker_id))
+    path = get_path(ticker_id)
+    if not path.exists():
+        sync(ticker_id)
+    return to_history(np.load(path, mmap_mode='r'))
@@ -11,7 +11,7 @@ https://docs.djangoproject.com/en/3.1/ref/settings/
 """
 from pathlib import Path
 
-from settings import db_creds, db_host, log_path, secret_key
+from settings import db_creds, db_host, log_path, price_store_root, secret_key
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -90,6 +90,9 @@ DATABASES = {
     }
 }
 
+# Optional memory-mapped price history store, see ticker.price_store
+PRICE_STORE_ROOT = price_store_root
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators